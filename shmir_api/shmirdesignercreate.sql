@@ -35,6 +35,12 @@ CREATE TABLE immuno (
     "link" varchar(100) NOT NULL
 );
 
+/*indexes for lookups by name (case-insensitive)
+and by first letters of miRNA_s (LIKE 'XX%')*/
+CREATE INDEX backbone_name_lower_idx ON backbone (lower("name"));
+CREATE INDEX backbone_miRNA_s_prefix_idx ON backbone
+    ("miRNA_s" varchar_pattern_ops);
+
 INSERT INTO immuno VALUES
     (DEFAULT, 'UGUGU', 'TLR7 and TLR8', 'http://www.ncbi.nlm.nih.gov/pubmed/16609928'
     ),
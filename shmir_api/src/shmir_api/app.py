@@ -8,10 +8,12 @@ DEBUG = True
 
 
 from flask import Flask
+from werkzeug.serving import WSGIRequestHandler
 
 from shmir_api.database.database import disconnect
 from shmir_api.database import handlers as db_handlers
 from shmir_api.mfold import handlers as mfold_handlers
+from shmir_api.jobs import handlers as jobs_handlers
 
 
 app = Flask(__name__)
@@ -43,11 +45,20 @@ app.add_url_rule('/database/backbone/get_by_mirna_s',
 app.add_url_rule('/database/immuno/get_all',
                  'database.immuno.get_all',
                  db_handlers.immuno_get_all)
+app.add_url_rule('/database/reload', 'database.reload',
+                 db_handlers.catalogs_reload)
 app.add_url_rule('/mfold', 'mfold', mfold_handlers.get_mfold)
+app.add_url_rule('/mfold/batch', 'mfold.batch', mfold_handlers.get_mfold_batch)
+app.add_url_rule('/mfold/cache', 'mfold.cache', mfold_handlers.get_cache_stats)
+app.add_url_rule('/jobs/submit', 'jobs.submit', jobs_handlers.job_submit)
+app.add_url_rule('/jobs/status', 'jobs.status', jobs_handlers.job_status)
+app.add_url_rule('/jobs/result', 'jobs.result', jobs_handlers.job_result)
 
 
 def run():
-    app.run()
+    #HTTP/1.1 lets clients keep connections alive between requests
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    app.run(threaded=True)
 
 if __name__ == '__main__':
     run()
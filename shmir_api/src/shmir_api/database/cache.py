@@ -0,0 +1,102 @@
+"""
+In-memory cache of catalogs with their JSON encoded in advance
+"""
+
+from collections import namedtuple
+
+from gzip import compress
+
+from hashlib import sha1
+
+from threading import Lock
+
+from time import time
+
+from flask.json import dumps
+
+
+CatalogEntry = namedtuple('CatalogEntry',
+                          ['etag', 'body', 'gzipped', 'index', 'checked'])
+
+
+class BackboneIndex:
+    """
+    Backbones by case-folded name and by first two letters of miRNA_s
+    """
+
+    def __init__(self, rows):
+        self.by_name = {}
+        self.by_miRNA_s = {}
+        for row in rows:
+            self.by_name.setdefault(row['name'].casefold(), row)
+            self.by_miRNA_s.setdefault(row['miRNA_s'][:2], []).append(row)
+
+    def get_by_name(self, name):
+        """
+        Backbone with the name, compared in a case-insensitive way
+        """
+        return self.by_name.get(name.casefold(), {})
+
+    def get_by_miRNA_s(self, letters):
+        """
+        Backbones whose miRNA_s starts with the two letters
+        """
+        return self.by_miRNA_s.get(letters.upper(), [])
+
+
+class CatalogCache:
+    """
+    Catalogs kept in memory as encoded JSON, its gzip compressed copy,
+    ETag (hash of the JSON) and index built from rows by the indexer given
+    for the catalog. Every catalog is loaded again after ttl seconds,
+    its ETag stays the same when nothing changed in the database.
+    """
+
+    def __init__(self, loaders, ttl, indexers=None):
+        self.loaders = loaders
+        self.ttl = ttl
+        self.indexers = indexers or {}
+        self.entries = {}
+        self.lock = Lock()
+
+    def get(self, name):
+        """
+        Returns CatalogEntry of the catalog, loading it when needed
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or time() - entry.checked >= self.ttl:
+                entry = self.entries[name] = self.load(name, entry)
+        return entry
+
+    def loaded(self, name):
+        """
+        Tells whether the catalog has been loaded
+        """
+        with self.lock:
+            return name in self.entries
+
+    def load(self, name, previous=None):
+        """
+        Queries the catalog and encodes it, the encoded copies
+        of previous entry are kept when the catalog did not change
+        """
+        rows = self.loaders[name]()
+        body = dumps(rows).encode('utf-8')
+        etag = sha1(body).hexdigest()
+        if previous is not None and previous.etag == etag:
+            return previous._replace(checked=time())
+        indexer = self.indexers.get(name)
+        index = indexer(rows) if indexer else None
+        return CatalogEntry(etag, body, compress(body), index, time())
+
+    def invalidate(self, name=None):
+        """
+        Forgets the catalog (all catalogs when no name is given),
+        it is loaded again on the next request
+        """
+        with self.lock:
+            if name is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(name, None)
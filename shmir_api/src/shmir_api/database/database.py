@@ -2,11 +2,17 @@
 Module for communication with database
 """
 
-from flask import g
+from threading import Lock
 
 from sqlsoup import SQLSoup
-from sqlalchemy import func
-from shmir_api.settings import DB_NAME, DB_USER, DB_PASS, DB_HOST, DB_PORT
+from sqlalchemy import create_engine, func, select
+from shmir_api.settings import (DB_NAME, DB_USER, DB_PASS, DB_HOST, DB_PORT,
+                                DB_POOL_SIZE, DB_POOL_RECYCLE)
+
+
+DB_URL = "postgresql+psycopg2://{user}:{password}@{host}:{port}/{dbname}".\
+    format(dbname=DB_NAME, user=DB_USER, password=DB_PASS, host=DB_HOST,
+           port=DB_PORT)
 
 
 class SerializeMixin:
@@ -18,27 +24,31 @@ class SerializeMixin:
                 if not key.startswith("_") and key != "id"}
 
 
+_db = None
+_db_lock = Lock()
+
+
 def get_db():
     """
-    Global connector variable
+    Global connector variable, the engine with its connection pool is created
+    and the schema is reflected once per process
     """
-    db = getattr(g, '_database', None)
-    if db is None:
-        conn_str = "postgresql+psycopg2://{user}:{password}@{host}:{port}/{dbname}"
-        fconn = conn_str.format(dbname=DB_NAME, user=DB_USER,
-                                password=DB_PASS, host=DB_HOST, port=DB_PORT)
-        db = g._database = SQLSoup(fconn, SerializeMixin)
-
-    return db
+    global _db
+    with _db_lock:
+        if _db is None:
+            engine = create_engine(DB_URL, pool_size=DB_POOL_SIZE,
+                                   pool_recycle=DB_POOL_RECYCLE)
+            _db = SQLSoup(engine, SerializeMixin)
+    return _db
 
 
 def disconnect():
     """
-    Global disconnector
+    Global disconnector, gives connection of the current session back
+    to the pool
     """
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.connection().close()
+    if _db is not None:
+        _db.session.remove()
 
 
 def serialized_all_by_query(query):
@@ -48,23 +58,40 @@ def serialized_all_by_query(query):
     return [elem.serialize() for elem in query.all()]
 
 
+def select_serialized(table, whereclause=None, limit=None):
+    """
+    Fast path bypassing ORM: selects columns of the table (without id)
+    and returns rows as dictionaries
+    """
+    db = get_db()
+    columns = [column for column in getattr(db, table)._table.columns
+               if column.name != 'id']
+    query = select(columns, whereclause, limit=limit)
+    names = [column.name for column in columns]
+    result = db.engine.execute(query)
+    try:
+        return [dict(zip(names, row)) for row in result]
+    finally:
+        result.close()
+
+
 def backbone_get_all():
     """
     Function which gets all serialized Backbones in database
     """
-    db = get_db()
-    return serialized_all_by_query(db.backbone)
+    return select_serialized('backbone')
 
 
 def backbone_get_by_name(name):
     """
     Function which gets one serialized Backbone by name
     """
-    db = get_db()
-    data = db.backbone.filter(func.lower(db.backbone.name) ==
-                              func.lower(name)).first()
+    table = get_db().backbone._table
+    data = select_serialized('backbone',
+                             func.lower(table.c.name) == func.lower(name),
+                             limit=1)
 
-    return data.serialize() if data else {}
+    return data[0] if data else {}
 
 
 def backbone_get_by_miRNA_s(letters):
@@ -72,16 +99,13 @@ def backbone_get_by_miRNA_s(letters):
     Function which gets serialized Backbones having first two letters of
     miRNA_s same as letters given (first two nucleotides of siRNA strand)
     """
-    db = get_db()
-    query = db.backbone.filter(db.backbone.miRNA_s.
-                               like("{}%".format(letters.upper())))
-
-    return serialized_all_by_query(query)
+    table = get_db().backbone._table
+    return select_serialized('backbone', table.c.miRNA_s.like(
+        "{}%".format(letters.upper())))
 
 
 def immuno_get_all():
     """
     Function which gets all serialized immuno sequences in database
     """
-    db = get_db()
-    return serialized_all_by_query(db.immuno)
+    return select_serialized('immuno')
@@ -2,46 +2,107 @@
 Handlers to communicate with database
 """
 
+from flask import Response, request
+from flask import jsonify as flask_jsonify
+
 from shmir_api.database import database
-from shmir_api.decorators import jsonify, require_json
+from shmir_api.database.cache import BackboneIndex, CatalogCache
+from shmir_api.decorators import require_json
+from shmir_api.settings import CATALOG_TTL
+from shmir_api.utils import json_error
+
+
+catalogs = CatalogCache({'backbone': database.backbone_get_all,
+                         'immuno': database.immuno_get_all}, CATALOG_TTL,
+                        {'backbone': BackboneIndex})
+
+
+def catalog_response(name):
+    """
+    Answers with cached catalog, gzip compressed when the client accepts it;
+    304 Not Modified when the client sends its ETag in If-None-Match
+    """
+    entry = catalogs.get(name)
+    if request.if_none_match.contains(entry.etag):
+        response = Response(status=304)
+    elif 'gzip' in request.accept_encodings:
+        response = Response(entry.gzipped, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def backbone_index():
+    """
+    Index of cached backbone catalog or None when the catalog is not loaded,
+    single lookups do not load the whole catalog
+    """
+    if not catalogs.loaded('backbone'):
+        return None
+    return catalogs.get('backbone').index
 
 
 #backbone
-@jsonify
 def backbone_get_all(**kwargs):
     """
-    Gets all data from backbone database.
+    Gets all data from backbone database (cached in memory).
     """
-    return database.backbone_get_all()
+    return catalog_response('backbone')
 
 
 @require_json(required_data_words=1)
 def backbone_get_by_name(data=None, **kwargs):
     """
-    Searching backbone database by name in a case-insensitive way.
+    Searching backbone database by name in a case-insensitive way
+    (in the index of cached catalog, in the database when the catalog
+    is not loaded or has no such backbone).
     """
-    return database.backbone_get_by_name(data)
+    index = backbone_index()
+    backbone = index.get_by_name(data) if index else {}
+    return backbone or database.backbone_get_by_name(data)
 
 
 @require_json(required_data_characters=2)
 def backbone_get_by_miRNA_s(data=None, **kwargs):
     """
     Searching backbone database comparing first two nucleotides of
-    endogenous miRNA with two nucleotides of siRNA strand.
+    endogenous miRNA with two nucleotides of siRNA strand
+    (in the index of cached catalog, in the database when the catalog
+    is not loaded or has no such backbones).
     """
-    return database.backbone_get_by_miRNA_s(data)
+    index = backbone_index()
+    backbones = index.get_by_miRNA_s(data) if index else []
+    return backbones or database.backbone_get_by_miRNA_s(data)
 
 
 #immuno
-@jsonify
 def immuno_get_all(**kwargs):
     """
-    Gets all informations from immuno database.
+    Gets all informations from immuno database (cached in memory).
+    """
+    return catalog_response('immuno')
+
+
+@require_json(require_data=False)
+def catalogs_reload(request_json=None, **kwargs):
+    """
+    Forgets cached catalog given as data (all catalogs without data),
+    it is loaded again from database on the next request
     """
-    return database.immuno_get_all()
+    name = request_json.get('data')
+    if name is not None and name not in catalogs.loaders:
+        return json_error('Data must be one of: {0}'.format(
+            ', '.join(sorted(catalogs.loaders))))
+    catalogs.invalidate(name)
+    return flask_jsonify(reloaded=[name] if name else
+                         sorted(catalogs.loaders))
 
 
-backbone_get_all.methods = ['POST']
+backbone_get_all.methods = ['GET', 'POST']
 backbone_get_by_name.methods = ['POST']
 backbone_get_by_miRNA_s.methods = ['POST']
-immuno_get_all.methods = ['POST']
+immuno_get_all.methods = ['GET', 'POST']
+catalogs_reload.methods = ['POST']
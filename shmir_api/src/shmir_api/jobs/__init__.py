@@ -0,0 +1,3 @@
+"""
+Package contains asynchronous design jobs and flask handlers module
+"""
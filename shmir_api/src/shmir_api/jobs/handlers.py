@@ -0,0 +1,51 @@
+"""
+Handlers to submit design jobs and fetch their results
+"""
+
+from flask import jsonify as flask_jsonify
+
+from shmir_api.decorators import require_json
+from shmir_api.jobs import jobs
+from shmir_api.mfold.workers import QueueFull
+from shmir_api.utils import busy_error, json_error
+
+
+@require_json(require_data=False)
+def job_submit(request_json=None, **kwargs):
+    """
+    Submits design of one siRNA or list of siRNAs given as data,
+    answers with id of the job
+    """
+    data = request_json.get('data')
+    if isinstance(data, str):
+        data = [data]
+    if not isinstance(data, list) or not data:
+        return json_error('Data must be a siRNA or a non-empty list of them')
+
+    try:
+        job_id = jobs.submit([str(seq).strip() for seq in data])
+    except QueueFull as exc:
+        return busy_error(str(exc))
+
+    return flask_jsonify(job=job_id)
+
+
+@require_json(required_data_words=1)
+def job_status(data=None, **kwargs):
+    """
+    Status of the job given by id.
+    """
+    return jobs.status(data)
+
+
+@require_json(required_data_words=1)
+def job_result(data=None, **kwargs):
+    """
+    Status and results of the job given by id.
+    """
+    return jobs.result(data)
+
+
+job_submit.methods = ['POST']
+job_status.methods = ['POST']
+job_result.methods = ['POST']
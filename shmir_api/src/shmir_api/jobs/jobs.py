@@ -0,0 +1,184 @@
+"""
+Asynchronous sh-miR design jobs stored in SQLite database
+"""
+
+import json
+import sqlite3
+
+from contextlib import closing
+
+from os import makedirs
+
+from os.path import dirname
+
+from subprocess import check_output
+
+from threading import Lock
+
+from time import time
+
+from uuid import uuid4
+
+from shmir_api.settings import DESIGNER_PATH, DESIGNER_PYTHON
+from shmir_api.settings import JOBS_DB_PATH, JOBS_WORKERS, JOBS_QUEUE_SIZE
+from shmir_api.mfold.workers import QueueFull, WorkerPool
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobStore:
+    """
+    Table of jobs with their input sequences, status and results
+    """
+
+    def __init__(self, path):
+        self.path = path
+        makedirs(dirname(path), exist_ok=True)
+        with self._connect() as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS job ('
+                'id TEXT PRIMARY KEY, status TEXT NOT NULL, '
+                'input TEXT NOT NULL, result TEXT, '
+                'created REAL NOT NULL, updated REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30))
+
+    def create(self, inputs):
+        """
+        Stores new queued job, returns its id
+        """
+        job_id = uuid4().hex
+        now = time()
+        with self._connect() as conn, conn:
+            conn.execute(
+                'INSERT INTO job VALUES (?, ?, ?, NULL, ?, ?)',
+                (job_id, QUEUED, json.dumps(inputs), now, now)
+            )
+        return job_id
+
+    def update(self, job_id, status, result=None):
+        """
+        Changes status of the job and stores its result
+        """
+        with self._connect() as conn, conn:
+            conn.execute(
+                'UPDATE job SET status = ?, result = ?, updated = ? '
+                'WHERE id = ?',
+                (status, json.dumps(result), time(), job_id)
+            )
+
+    def get(self, job_id):
+        """
+        Returns serialized job or empty dict if there is no such job
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT id, status, input, result, created, updated '
+                'FROM job WHERE id = ?', (job_id,)
+            ).fetchone()
+        if row is None:
+            return {}
+        return {
+            'id': row[0],
+            'status': row[1],
+            'input': json.loads(row[2]),
+            'result': json.loads(row[3]) if row[3] else None,
+            'created': row[4],
+            'updated': row[5],
+        }
+
+    def pending(self):
+        """
+        Returns ids and inputs of jobs which have not been finished
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, input FROM job WHERE status IN (?, ?) '
+                'ORDER BY created', (QUEUED, RUNNING)
+            ).fetchall()
+        return [(job_id, json.loads(inputs)) for job_id, inputs in rows]
+
+
+def design(sequence):
+    """
+    Runs sh-miR designer for one siRNA and returns its result
+    """
+    output = check_output([DESIGNER_PYTHON, DESIGNER_PATH, '--json',
+                           sequence], cwd=dirname(DESIGNER_PATH))
+    return json.loads(output.decode('utf-8'))
+
+
+def run_job(store, job_id, inputs):
+    """
+    Designs sh-miRs for all inputs of the job and stores the results
+    """
+    store.update(job_id, RUNNING)
+    try:
+        results = [design(sequence) for sequence in inputs]
+    except Exception as exc:
+        store.update(job_id, FAILED, {'error': str(exc)})
+    else:
+        store.update(job_id, DONE, results)
+
+
+workers = WorkerPool(JOBS_WORKERS, JOBS_QUEUE_SIZE)
+
+_store = None
+_store_lock = Lock()
+
+
+def get_store():
+    """
+    Global job store, jobs left unfinished by previous process
+    are queued again when it is created (as many as the queue takes,
+    the rest stays pending until the next start)
+    """
+    global _store
+    pending = []
+    with _store_lock:
+        if _store is None:
+            _store = JobStore(JOBS_DB_PATH)
+            pending = _store.pending()
+    for job_id, inputs in pending:
+        try:
+            workers.submit(run_job, _store, job_id, inputs, timeout=0)
+        except QueueFull:
+            break
+    return _store
+
+
+def submit(inputs):
+    """
+    Creates job designing sh-miRs for all inputs, returns its id
+    """
+    store = get_store()
+    job_id = store.create(inputs)
+    try:
+        workers.submit(run_job, store, job_id, inputs, timeout=0)
+    except QueueFull as exc:
+        store.update(job_id, FAILED, {'error': str(exc)})
+        raise
+    return job_id
+
+
+def status(job_id):
+    """
+    Returns job without its input and result
+    """
+    job = get_store().get(job_id)
+    job.pop('input', None)
+    job.pop('result', None)
+    return job
+
+
+def result(job_id):
+    """
+    Returns job with its result
+    """
+    return get_store().get(job_id)
@@ -0,0 +1,157 @@
+"""
+Content-addressed cache of mfold results stored on disk
+"""
+
+from collections import Counter, OrderedDict
+
+from hashlib import sha1
+
+from os import listdir, makedirs, rename, stat, utime
+
+from os.path import basename, dirname, getsize, isdir, join
+
+from shutil import copy, rmtree
+
+from tempfile import mkdtemp
+
+from threading import Lock
+
+
+def cache_key(sequence, params):
+    """
+    Hash of the normalized sequence and the parameters mfold is run with
+    """
+    normalized = ''.join(sequence.split()).upper()
+    content = '{0}|{1}'.format(normalized, params)
+    return sha1(content.encode('utf-8')).hexdigest()
+
+
+class FoldCache:
+    """
+    Directory-per-key cache of mfold output files with LRU eviction
+    once the total size of cached files exceeds max_size bytes.
+    Entries returned by get and put are pinned, so they are not evicted
+    while their files are used, until they are given back to release
+    """
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = None
+        self._pins = Counter()
+        self._lock = Lock()
+
+    def _index(self):
+        """
+        Sizes of cached entries ordered from the least recently used,
+        read from disk on first use
+        """
+        if self._entries is None:
+            makedirs(self.path, exist_ok=True)
+            entries = []
+            for key in listdir(self.path):
+                entry = join(self.path, key)
+                if key.startswith('.') or not isdir(entry):
+                    continue
+                size = sum(getsize(join(entry, name))
+                           for name in listdir(entry))
+                entries.append((stat(entry).st_mtime, key, size))
+
+            self._entries = OrderedDict(
+                (key, size) for _, key, size in sorted(entries)
+            )
+            self.size = sum(self._entries.values())
+        return self._entries
+
+    def _files(self, key):
+        entry = join(self.path, key)
+        return sorted(join(entry, name) for name in listdir(entry))
+
+    def get(self, *keys):
+        """
+        Returns list of cached files of the first cached key (pinned)
+        or None when none of keys is cached
+        """
+        with self._lock:
+            entries = self._index()
+            for key in keys:
+                if key in entries and isdir(join(self.path, key)):
+                    entries.move_to_end(key)
+                    utime(join(self.path, key))
+                    self.hits += 1
+                    self._pins[key] += 1
+                    return self._files(key)
+
+                if key in entries:
+                    self.size -= entries.pop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, files):
+        """
+        Copies files to the cache and returns list of cached files (pinned)
+        """
+        with self._lock:
+            entries = self._index()
+            tmp_dirname = mkdtemp(prefix='.', dir=self.path)
+            for filename in files:
+                copy(filename, tmp_dirname)
+
+            try:
+                rename(tmp_dirname, join(self.path, key))
+            except OSError:
+                # the same result has already been stored
+                rmtree(tmp_dirname, ignore_errors=True)
+
+            cached_files = self._files(key)
+            if key not in entries:
+                entries[key] = sum(getsize(name) for name in cached_files)
+                self.size += entries[key]
+            entries.move_to_end(key)
+            self._pins[key] += 1
+            self._evict()
+
+            return cached_files
+
+    def release(self, files):
+        """
+        Unpins the entry of files returned by get or put
+        """
+        if not files:
+            return
+        key = basename(dirname(files[0]))
+        with self._lock:
+            self._pins[key] -= 1
+            if self._pins[key] <= 0:
+                del self._pins[key]
+            self._evict()
+
+    def _evict(self):
+        """
+        Removes least recently used entries which are not pinned,
+        the newest one always stays
+        """
+        for key in list(self._entries)[:-1]:
+            if self.size <= self.max_size:
+                break
+            if self._pins[key]:
+                continue
+            rmtree(join(self.path, key), ignore_errors=True)
+            self.size -= self._entries.pop(key)
+
+    def stats(self):
+        """
+        Counters of cache usage
+        """
+        with self._lock:
+            entries = self._index()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(entries),
+                'size': self.size,
+                'max_size': self.max_size,
+            }
@@ -5,15 +5,53 @@ Handlers to comunicate with mfold
 
 from flask import send_file
 
-from shmir_api.decorators import require_json
-from .mfold import mfold
+from shmir_api.decorators import jsonify, require_json
+from shmir_api.utils import busy_error, json_error
+from .mfold import cache, mfold, mfold_batch
+from .workers import QueueFull
 
 
 @require_json(jsonify=False)
-def get_mfold(data=None, **kwargs):
-    filename = mfold(data)
-
-    return send_file(filename)
+def get_mfold(data=None, request_json=None, **kwargs):
+    """
+    Folds the sequence given as data; with "pdf": false in request
+    only ss file is created and returned
+    """
+    try:
+        mfold_zip = mfold(data, pdf=request_json.get('pdf', True))
+    except QueueFull as exc:
+        return busy_error(str(exc))
+
+    return send_file(mfold_zip, mimetype='application/zip')
+
+
+@require_json(require_data=False, jsonify=False)
+def get_mfold_batch(request_json=None, **kwargs):
+    """
+    Folds the list of sequences given as data in one request; files of the
+    n-th sequence are stored in the directory named n of returned zip
+    """
+    data = request_json.get('data')
+    if not isinstance(data, list) or not data:
+        return json_error('Data must be a non-empty list of sequences')
+
+    try:
+        mfold_zip = mfold_batch([str(seq).strip() for seq in data],
+                                pdf=request_json.get('pdf', True))
+    except QueueFull as exc:
+        return busy_error(str(exc))
+
+    return send_file(mfold_zip, mimetype='application/zip')
+
+
+@jsonify
+def get_cache_stats(**kwargs):
+    """
+    Hit/miss counters and size of the mfold results cache
+    """
+    return cache.stats()
 
 
 get_mfold.methods = ['POST']
+get_mfold_batch.methods = ['POST']
+get_cache_stats.methods = ['POST']
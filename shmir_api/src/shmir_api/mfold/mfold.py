@@ -1,40 +1,161 @@
-from os import chdir, environ, fork, waitpid, path, makedirs, execl
+from os import environ, makedirs
 
 from os.path import dirname
 from os.path import join
+from os.path import basename
 
 from datetime import datetime
 
+from io import BytesIO
+
+from shutil import rmtree
+
+from subprocess import call
+
+from tempfile import mkdtemp
+
 from zipfile import ZipFile
 
+from shmir_api.settings import MFOLD_PROCESSES
+from shmir_api.settings import MFOLD_QUEUE_SIZE, MFOLD_QUEUE_TIMEOUT
+from shmir_api.settings import MFOLD_CACHE_PATH, MFOLD_CACHE_SIZE
+
+from .cache import FoldCache, cache_key
+from .workers import WorkerPool
+
+
+MFOLD_FILES = join(dirname(__file__), "mfold_files")
+
+#parameters of every mfold run, part of the cache key
+MFOLD_PARAMS = 'P=1'
+
+#additional parameter of runs which create only ss files, without plots
+SS_ONLY_PARAM = 'PLOT=NO'
+
+cache = FoldCache(MFOLD_CACHE_PATH, MFOLD_CACHE_SIZE)
+
+workers = WorkerPool(MFOLD_PROCESSES, MFOLD_QUEUE_SIZE)
 
-def mfold(input):
+
+def run_mfold(input, pdf=True):
     """
-    Executes mfold in order to generate appropriate files
+    Executes mfold in its own scratch directory in order to generate
+    appropriate files, returns paths of generated pdf and ss files
+    or only ss file if pdf is False
     """
     current_datetime = datetime.now().strftime('%H:%M:%S-%d-%m-%y')
 
-    mfold_dirname = "mfold_files"
-    tmp_dirname = join(dirname(__file__), mfold_dirname, current_datetime)
-
-    if not path.exists(tmp_dirname):
-        makedirs(tmp_dirname)
-    chdir(tmp_dirname)
+    makedirs(MFOLD_FILES, exist_ok=True)
+    tmp_dirname = mkdtemp(prefix=current_datetime + '-', dir=MFOLD_FILES)
 
-    with open(current_datetime, "w") as f:
+    with open(join(tmp_dirname, current_datetime), "w") as f:
         f.write(input)
 
-    pid = fork()
+    args = [environ['MFOLD_PATH'], 'SEQ=%s %s' % (current_datetime,
+                                                   MFOLD_PARAMS)]
+    if not pdf:
+        args.append(SS_ONLY_PARAM)
+    call(args, cwd=tmp_dirname)
+
+    ss_file = join(tmp_dirname, "%s_1.ss" % current_datetime)
+    if not pdf:
+        return [ss_file]
+    return [join(tmp_dirname, "%s_1.pdf" % current_datetime), ss_file]
+
+
+def fold_key(input, pdf=True):
+    """
+    Cache key of mfold run with or without plots
+    """
+    if pdf:
+        return cache_key(input, MFOLD_PARAMS)
+    return cache_key(input, '%s %s' % (MFOLD_PARAMS, SS_ONLY_PARAM))
+
+
+def cached(input, pdf=True):
+    """
+    Returns cached files or None, full results serve ss only requests too
+    """
+    if pdf:
+        return cache.get(fold_key(input))
 
-    if pid == 0:
-        execl(environ['MFOLD_PATH'], 'mfold', 'SEQ=%s P=1' % current_datetime)
+    files = cache.get(fold_key(input), fold_key(input, pdf=False))
+    if files is not None:
+        files = [filename for filename in files if filename.endswith('.ss')]
+    return files
 
-    waitpid(pid, 0)
 
-    zipname = "%s.zip" % current_datetime
+def submit(input, pdf=True):
+    """
+    Queues mfold run in the worker pool, returns Future of its files
+    """
+    return workers.submit(run_mfold, input, pdf, timeout=MFOLD_QUEUE_TIMEOUT)
+
+
+def fold(input, pdf=True):
+    """
+    Returns files generated by mfold, taken from cache if possible
+    """
+    files = cached(input, pdf)
+    if files is None:
+        files = store(input, pdf, submit(input, pdf).result())
+    return files
+
+
+def store(input, pdf, files):
+    """
+    Copies files generated by mfold to the cache and removes
+    the scratch directory of the run, returns cached files
+    """
+    try:
+        return cache.put(fold_key(input, pdf), files)
+    finally:
+        if files:
+            rmtree(dirname(files[0]), ignore_errors=True)
+
+
+def mfold(input, pdf=True):
+    """
+    Returns zip (in memory) with files generated by mfold,
+    without pdf file if pdf is False
+    """
+    files = fold(input, pdf)
+
+    mfold_zip = BytesIO()
+    try:
+        with ZipFile(mfold_zip, 'w') as zip_file:
+            for filename in files:
+                zip_file.write(filename, basename(filename))
+    finally:
+        cache.release(files)
+
+    mfold_zip.seek(0)
+    return mfold_zip
+
+
+def mfold_batch(inputs, pdf=True):
+    """
+    Executes mfold for all inputs in the worker pool and packs the results
+    into one zip (in memory); files generated for the n-th input are stored
+    in the directory named n. Only inputs missing in cache are folded
+    """
+    results = [cached(input, pdf) for input in inputs]
+    missing = [index for index, files in enumerate(results) if files is None]
+
+    try:
+        futures = [submit(inputs[index], pdf) for index in missing]
+        for index, future in zip(missing, futures):
+            results[index] = store(inputs[index], pdf, future.result())
 
-    with ZipFile(zipname, 'w') as mfold_zip:
-        mfold_zip.write("%s_1.pdf" % current_datetime)
-        mfold_zip.write("%s_1.ss" % current_datetime)
+        batch_zip = BytesIO()
+        with ZipFile(batch_zip, 'w') as zip_file:
+            for index, files in enumerate(results):
+                for filename in files:
+                    zip_file.write(filename,
+                                   '%d/%s' % (index, basename(filename)))
+    finally:
+        for files in results:
+            cache.release(files)
 
-    return join(tmp_dirname, zipname)
+    batch_zip.seek(0)
+    return batch_zip
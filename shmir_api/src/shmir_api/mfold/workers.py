@@ -0,0 +1,58 @@
+"""
+Pool of worker threads running mfold jobs from a bounded queue
+"""
+
+from concurrent.futures import Future
+
+from queue import Queue, Full
+
+from threading import Lock, Thread
+
+
+class QueueFull(Exception):
+    """
+    Raised when no job can be queued in the given time
+    """
+
+
+class WorkerPool:
+    """
+    Fixed number of daemon threads executing jobs put on a bounded queue;
+    threads are started with the first submitted job
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue = Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = Lock()
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = Thread(target=self._work, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            future, function, args = self.queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(function(*args))
+                except Exception as exc:
+                    future.set_exception(exc)
+            self.queue.task_done()
+
+    def submit(self, function, *args, timeout=None):
+        """
+        Queues the job and returns Future of its result,
+        raises QueueFull if the queue stays full for timeout seconds
+        """
+        self._start()
+        future = Future()
+        try:
+            self.queue.put((future, function, args), timeout=timeout)
+        except Full:
+            raise QueueFull('mfold queue is full, try again later')
+        return future
@@ -1,5 +1,6 @@
 from configparser import ConfigParser
 from os import environ
+from os.path import dirname, join
 
 config = ConfigParser()
 config.readfp(open(environ['SHMIR_API_SETTINGS']))
@@ -11,5 +12,42 @@ DB_PASS = config['password']
 DB_HOST = config['host']
 DB_PORT = config['port']
 
+#connections kept open in the pool of database engine
+#and seconds after which they are opened again
+DB_POOL_SIZE = 10
+DB_POOL_RECYCLE = 3600
+
+#seconds after which cached backbone and immuno catalogs are loaded again
+CATALOG_TTL = 300
+
 #nucleotide type for ncbi database
 NUCLEOTIDE_DB = 'nucleotide'
+
+#number of mfold processes running in parallel, maximum number of waiting
+#mfold jobs, seconds a request waits for a free place in the queue
+#and seconds a client is told to wait (Retry-After) when the queue is full
+MFOLD_PROCESSES = 12
+MFOLD_QUEUE_SIZE = 1000
+MFOLD_QUEUE_TIMEOUT = 30
+RETRY_AFTER = 30
+
+#directory and maximum size in bytes of the mfold results cache
+MFOLD_CACHE_PATH = environ.get(
+    'MFOLD_CACHE_PATH', join(dirname(__file__), 'mfold', 'mfold_cache')
+)
+MFOLD_CACHE_SIZE = 512 * 1024 * 1024
+
+#database of design jobs, number of jobs designed in parallel
+#and maximum number of waiting jobs
+JOBS_DB_PATH = environ.get(
+    'JOBS_DB_PATH', join(dirname(__file__), 'jobs', 'jobs.sqlite')
+)
+JOBS_WORKERS = 4
+JOBS_QUEUE_SIZE = 1000
+
+#python 2 interpreter and main.py of sh-miR designer run by design jobs
+DESIGNER_PYTHON = environ.get('DESIGNER_PYTHON', 'python2.7')
+DESIGNER_PATH = environ.get(
+    'DESIGNER_PATH',
+    join(dirname(__file__), '..', '..', '..', 'shmir_designer', 'main.py')
+)
@@ -4,8 +4,19 @@ Utilies for handling json
 
 from flask import jsonify
 
+from shmir_api.settings import RETRY_AFTER
+
 
 def json_error(error):
     """Input: string
     Output: dictionary"""
     return jsonify(error=error)
+
+
+def busy_error(error, retry_after=RETRY_AFTER):
+    """Input: string, seconds
+    Output: response with status 503 and Retry-After header"""
+    response = jsonify(error=error)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
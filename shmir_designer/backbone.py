@@ -1,20 +1,27 @@
 """
 Module handling pri-miRNA objects
 """
-import urllib2
+import os
+import time
+import tempfile
+import threading
 import json
 
-#HOST = 'http://150.254.78.155:5000/'
-HOST = 'http://127.0.0.1:5000/'
+from client import client, ClientError
 
-URL_ALL = HOST + 'database/get_all'
-URL_BY_NAME = HOST + 'database/get_by_name'
-URL_BY_MIRNA_S = HOST + 'database/get_by_mirna_s'
+# paths relative to base url of the API (client.BASE_URL)
+URL_ALL = 'database/get_all'
+URL_BY_NAME = 'database/get_by_name'
+URL_BY_MIRNA_S = 'database/get_by_mirna_s'
+URL_IMMUNO = 'database/immuno/get_all'
 
-HEADERS = {'content-type': 'application/json'}
+# seconds the catalog snapshot is used without revalidation
+# and the optional file keeping it between runs
+CATALOG_TTL = int(os.environ.get('SHMIR_CATALOG_TTL', 60))
+CATALOG_PATH = os.environ.get('SHMIR_CATALOG_PATH')
 
 
-class Backbone:
+class Backbone(object):
     """pri-miRNA class"""
     def __init__(self, name, flanks3_s, flanks3_a, flanks5_s, flanks5_a,
                  loop_s, loop_a, miRNA_s, miRNA_a, miRNA_length, miRNA_min,
@@ -39,6 +46,12 @@ class Backbone:
         self.miRBase_link = miRBase_link
         self.active_strand = active_strand
 
+    def copy(self, **changes):
+        """Makes copy of object with given variables changed"""
+        frame = object.__new__(Backbone)
+        frame.__dict__.update(self.__dict__, **changes)
+        return frame
+
     def serialize(self):
         """Makes dictionary of object variables"""
         return vars(self)
@@ -56,16 +69,107 @@ def qbackbone(data=None, url=None):
     json_data = {}
     if data:
         json_data.update({"data": data})
-    req = urllib2.Request(url, json.dumps(json_data), headers=HEADERS)
     try:
-        return json.loads(urllib2.urlopen(req).read())
-    except urllib2.URLError:
+        response = client.post_json(url, json_data, idempotent=True)
+        if response.status != 200:
+            return {'error': 'Database answered with status %d.'
+                    % response.status}
+        return json.loads(response.body)
+    except (ClientError, ValueError):
         return {'error': 'Connection to database refused.'}
 
 
+class CatalogSnapshot(object):
+    """Local snapshot of a catalog (all backbones by default)
+    with the ETag given by the API.
+    Snapshot is used as it is for ttl seconds, later it is revalidated
+    by conditional request (304 when unchanged). When the API can not be
+    reached the last snapshot is used."""
+    def __init__(self, ttl=CATALOG_TTL, path=CATALOG_PATH, url=URL_ALL):
+        self.url = url
+        self.ttl = ttl
+        self.path = path
+        self.data = None
+        self.etag = None
+        self.checked = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Returns the catalog, from the snapshot when possible"""
+        with self.lock:
+            if self.data is None:
+                self.load()
+            if self.data is not None and \
+                    time.time() - self.checked < self.ttl:
+                return self.data
+            self.revalidate()
+            if self.data is None:
+                return {'error': 'Connection to database refused.'}
+            return self.data
+
+    def revalidate(self):
+        """Asks the API for the catalog unless it still has the same ETag"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        try:
+            response = client.request('GET', self.url, headers=headers)
+            if response.status == 304:
+                data = self.data
+            elif response.status == 200:
+                data = json.loads(response.body)
+            else:
+                return
+        except (ClientError, ValueError):
+            return
+        if 'error' in data:
+            return
+        self.data = data
+        self.etag = response.headers.get('etag', self.etag)
+        self.checked = time.time()
+        self.dump()
+
+    def load(self):
+        """Reads snapshot from file"""
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except (IOError, ValueError):
+            return
+        self.data = snapshot['data']
+        self.etag = snapshot['etag']
+        self.checked = snapshot['checked']
+
+    def dump(self):
+        """Writes snapshot to file"""
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_name = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'data': self.data, 'etag': self.etag,
+                       'checked': self.checked}, f)
+        os.rename(tmp_name, self.path)
+
+    def clear(self):
+        """Forgets the in-process snapshot"""
+        with self.lock:
+            self.data = self.etag = None
+            self.checked = 0
+
+
+catalog = CatalogSnapshot()
+immuno = CatalogSnapshot(path=None, url=URL_IMMUNO)
+
+
 def get_all(data=None):
-    """Takes all objects from database"""
-    return qbackbone(data=data, url=URL_ALL)
+    """Takes all objects from database, using the local snapshot
+    of the catalog when no data is given"""
+    if data:
+        return qbackbone(data=data, url=URL_ALL)
+    return catalog.get()
 
 
 def get_by_name(data=None):
@@ -76,3 +180,9 @@ def get_by_name(data=None):
 def get_by_mirna_s(data=None):
     """Takes object from database depending on the sequence of miRNA_s"""
     return qbackbone(data=data, url=URL_BY_MIRNA_S)
+
+
+def get_immuno():
+    """Takes all immunostimulatory motifs from database,
+    using the local snapshot"""
+    return immuno.get()
@@ -0,0 +1,133 @@
+"""
+Shared client of RESTful API which keeps connections alive between requests
+"""
+
+import os
+import json
+import socket
+import httplib
+import urlparse
+from gzip import GzipFile
+from collections import namedtuple
+from cStringIO import StringIO
+from Queue import LifoQueue, Empty, Full
+
+
+# base url of RESTful API, seconds to wait for an answer, maximum number
+# of idle connections kept open and switch asking for gzip compressed answers
+BASE_URL = os.environ.get('SHMIR_API_URL', 'http://127.0.0.1:5000/')
+TIMEOUT = float(os.environ.get('SHMIR_API_TIMEOUT', 300))
+POOL_SIZE = 16
+GZIP = os.environ.get('SHMIR_API_GZIP', '1') == '1'
+
+HEADERS = {'content-type': 'application/json'}
+
+# methods which may be sent again after the server has received them
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+Response = namedtuple('Response', ['status', 'headers', 'body'])
+
+
+class ClientError(Exception):
+    """Exception raised when RESTful API can not be reached"""
+
+
+class Client(object):
+    """HTTP client with a pool of keep-alive connections to one host.
+    Idle connections are reused, a reused connection closed by the server
+    in the meantime is replaced and the request is sent again when it
+    was not sent yet or it is idempotent."""
+    def __init__(self, base_url=BASE_URL, size=POOL_SIZE, timeout=TIMEOUT,
+                 gzip=GZIP):
+        url = urlparse.urlsplit(base_url)
+        self.secure = url.scheme == 'https'
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip('/') + '/'
+        self.timeout = timeout
+        self.gzip = gzip
+        self.connections = LifoQueue(size)
+
+    def connection(self, timeout):
+        """Takes idle connection from the pool or opens new one"""
+        try:
+            connection = self.connections.get_nowait()
+        except Empty:
+            if self.secure:
+                connection = httplib.HTTPSConnection(self.host, self.port)
+            else:
+                connection = httplib.HTTPConnection(self.host, self.port)
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection
+
+    def release(self, connection):
+        """Puts connection back to the pool, closes it if the pool is full"""
+        try:
+            self.connections.put_nowait(connection)
+        except Full:
+            connection.close()
+
+    def request(self, method, path, body=None, headers=None, timeout=None,
+                idempotent=None):
+        """Sends request to path relative to the base url. Request sent
+        through reused connection which failed before the answer is sent
+        again only when it is idempotent (by default methods
+        in IDEMPOTENT_METHODS), other ones only when they failed
+        to be sent, so the server never runs them twice
+        Input: method, path, body string, dictionary of headers, seconds,
+        bool
+        Output: Response with status, dictionary of headers and body"""
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        headers = dict(headers or {})
+        if self.gzip:
+            headers.setdefault('Accept-Encoding', 'gzip')
+        if timeout is None:
+            timeout = self.timeout
+
+        for retry in (True, False):
+            connection = self.connection(timeout)
+            reused = connection.sock is not None
+            sent = False
+            try:
+                connection.request(method, self.prefix + path.lstrip('/'),
+                                   body, headers)
+                sent = True
+                response = connection.getresponse()
+                data = response.read()
+            except socket.timeout as exc:
+                connection.close()
+                raise ClientError('Timeout: %s' % exc)
+            except (httplib.HTTPException, socket.error) as exc:
+                connection.close()
+                if reused and retry and (idempotent or not sent):
+                    continue
+                raise ClientError(str(exc) or exc.__class__.__name__)
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self.release(connection)
+        if response.getheader('content-encoding') == 'gzip':
+            data = GzipFile(fileobj=StringIO(data)).read()
+        return Response(response.status, dict(response.getheaders()), data)
+
+    def post_json(self, path, data, timeout=None, idempotent=False):
+        """Sends data as json in POST request, idempotent tells
+        that the request does not change anything on the server"""
+        return self.request('POST', path, json.dumps(data), HEADERS,
+                            timeout, idempotent)
+
+    def close(self):
+        """Closes all idle connections"""
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except Empty:
+                return
+
+
+client = Client()
@@ -6,26 +6,49 @@
 """
 
 from validators import check_input
+from errors import InputException
 from utils import get_frames
+from utils import frame_tables
 from utils import reverse_complement
-from score import score_frame
+from score import score_frames
 from score import score_homogeneity
 from score import score_two_same_strands
+from score import templates as score_templates
 from backbone import get_all
-from backbone import Backbone
-from mfold import mfold
+from mfold import fold
+from multiprocessing.pool import ThreadPool
+from itertools import izip
+from functools import partial
+import json
 import sys
 
 
-def main(input_str):
+# maximum number of mfold requests running at the same time
+FOLD_PROCESSES = 12
+
+
+def main(input_str, processes=FOLD_PROCESSES):
     """
     Main function takes string input and returns the best results depending
     on scoring. Single result include sh-miR sequence,
-    score and link to 2D structure from mfold program
+    score and link to 2D structure from mfold program.
+    Templates of all frames are folded concurrently, at most `processes`
+    at a time, and then scored together in one batch.
+    Structures are folded without pdf files, which are requested
+    only for the best results.
     """
 
-    sequence = check_input(input_str)
-    seq1, seq2, shift_left, shift_right = sequence
+    seq1, seq2, shift_left, shift_right = check_input(input_str)
+    return design(seq1, seq2, shift_left, shift_right, processes)
+
+
+def design(seq1, seq2, shift_left=0, shift_right=0,
+           processes=FOLD_PROCESSES):
+    """
+    Designs sh-miRs of already validated siRNA (see check_input),
+    the second strand is generated when it is empty.
+    Returns the best results like main.
+    """
     if not seq2:
         seq2 = reverse_complement(seq1)
     all_frames = get_all()
@@ -33,27 +56,51 @@ def main(input_str):
         return all_frames
 
     frames = get_frames(seq1, seq2, shift_left, shift_right, all_frames)
-    original_frames = [Backbone(**elem) for elem in all_frames]
-
-    frames_with_score = []
-    for frame_tuple, original in zip(frames, original_frames):
-        score = 0
-        frame, insert1, insert2 = frame_tuple
-        mfold_data = mfold(frame.template(insert1, insert2))
-        if 'error' in mfold_data:
-            return mfold_data
-        pdf, ss = mfold_data[0], mfold_data[1]
-        score += score_frame(frame_tuple, ss, original)
-        score += score_homogeneity(original)
-        score += score_two_same_strands(seq1, original)
-        frames_with_score.append(
-            (score, frame.template(insert1, insert2), frame.name, pdf)
-        )
-
-    sorted_frames = [elem for elem in sorted(frames_with_score,
-                     key=lambda x: x[0], reverse=True) if elem[0] > 60]
-    return {'result': sorted_frames[:3]}
+    original_frames = frame_tables.load(all_frames)
+    score_templates.load(original_frames)
+
+    templates = [frame.template(insert1, insert2)
+                 for frame, insert1, insert2 in frames]
+
+    pool = ThreadPool(max(1, min(processes, len(templates))))
+    try:
+        structures = []
+        for mfold_data in pool.imap(partial(fold, pdf=False), templates):
+            if 'error' in mfold_data:
+                return mfold_data
+            structures.append(mfold_data[1])
+
+        frames_with_score = []
+        scores = score_frames(frames, structures, original_frames)
+        for frame_tuple, original, template, score in izip(
+                frames, original_frames, templates, scores):
+            score += score_homogeneity(original)
+            score += score_two_same_strands(seq1, original)
+            frames_with_score.append((int(score), template,
+                                      frame_tuple[0].name))
+
+        sorted_frames = [elem for elem in sorted(frames_with_score,
+                         key=lambda x: x[0], reverse=True) if elem[0] > 60]
+        best_frames = sorted_frames[:3]
+
+        results = []
+        folds = pool.map(fold, [template for _, template, _ in best_frames])
+        for frame_with_score, mfold_data in zip(best_frames, folds):
+            if 'error' in mfold_data:
+                return mfold_data
+            results.append(frame_with_score + (mfold_data[0],))
+    finally:
+        pool.terminate()
+
+    return {'result': results}
 
 
 if __name__ == '__main__':
-    print(main(" ".join(sys.argv[1:])))
+    if sys.argv[1:2] == ['--json']:
+        try:
+            result = main(" ".join(sys.argv[2:]))
+        except InputException as exc:
+            result = {'error': exc.message}
+        print(json.dumps(result))
+    else:
+        print(main(" ".join(sys.argv[1:])))
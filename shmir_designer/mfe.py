@@ -0,0 +1,275 @@
+"""
+.. module:: mfe
+    :synopsis: This module provides in-process minimum free energy folding.
+
+Simplified nearest neighbour model (Turner 2004 Watson-Crick stacks,
+loop initiation by size, linear multiloop) solved with dynamic programming
+vectorized over whole diagonals of the energy matrices.
+Energies are integers in 0.01 kcal/mol.
+"""
+
+from math import log
+
+import numpy as np
+
+
+INF = 10 ** 7
+MIN_HAIRPIN = 3
+MAX_LOOP = 30
+
+BASES = 'ACGU'
+PAIRS = ['AU', 'CG', 'GC', 'UA', 'GU', 'UG']
+
+# 5'XY3'/3'X'Y'5' stacks, outer pair XX' first
+WC_STACKS = {
+    ('AU', 'AU'): -93, ('UA', 'UA'): -93,
+    ('AU', 'UA'): -110,
+    ('UA', 'AU'): -133,
+    ('CG', 'UA'): -208, ('AU', 'GC'): -208,
+    ('CG', 'AU'): -211, ('UA', 'GC'): -211,
+    ('GC', 'UA'): -224, ('AU', 'CG'): -224,
+    ('GC', 'AU'): -235, ('UA', 'CG'): -235,
+    ('CG', 'GC'): -236,
+    ('GC', 'GC'): -326, ('CG', 'CG'): -326,
+    ('GC', 'CG'): -342,
+}
+GU_STACK = -130
+
+HAIRPIN = {3: 540, 4: 560, 5: 570, 6: 540, 7: 600, 8: 550, 9: 640}
+BULGE = {1: 380, 2: 280, 3: 320, 4: 360, 5: 400, 6: 440}
+INTERIOR = {2: 50, 3: 160, 4: 110, 5: 200, 6: 200}
+LOOP_EXTRAPOLATION = 107.8  # 1.75 RT at 37 degrees
+ASYMMETRY = 60
+MAX_ASYMMETRY = 300
+
+TERMINAL_AU = 50
+INTERIOR_AU = 70
+MULTI_A = 340
+MULTI_B = 0
+MULTI_C = 40
+
+
+def loop_initiation(table, size):
+    """Initiation energy of loop, extrapolated logarithmically
+    above the largest tabulated size"""
+    largest = max(table)
+    if size <= largest:
+        return table[size]
+    return table[largest] + int(round(
+        LOOP_EXTRAPOLATION * log(float(size) / largest)))
+
+
+def pair_tables():
+    """Pair type of every two bases (0 for bases which do not pair),
+    stack energy and AU/GU penalties of every pair type"""
+    pair_type = np.zeros((len(BASES) + 1, len(BASES) + 1), dtype=np.int64)
+    for number, pair in enumerate(PAIRS, 1):
+        pair_type[BASES.index(pair[0]), BASES.index(pair[1])] = number
+
+    stack = np.zeros((len(PAIRS) + 1, len(PAIRS) + 1), dtype=np.int64)
+    for outer, outer_pair in enumerate(PAIRS, 1):
+        for inner, inner_pair in enumerate(PAIRS, 1):
+            stack[outer, inner] = WC_STACKS.get((outer_pair, inner_pair),
+                                                GU_STACK)
+
+    weak = np.array([0] + [pair not in ('CG', 'GC') for pair in PAIRS],
+                    dtype=np.int64)
+    return pair_type, stack, weak * TERMINAL_AU, weak * INTERIOR_AU
+
+
+def loop_tables():
+    """Offsets (left, right unpaired) of every interior loop, bulge
+    and stack closed by a pair with their size dependent energies"""
+    left, right, energy = [], [], []
+    for size in range(MAX_LOOP + 1):
+        for p in range(size + 1):
+            q = size - p
+            left.append(p)
+            right.append(q)
+            if size == 0:
+                energy.append(0)
+            elif p == 0 or q == 0:
+                energy.append(loop_initiation(BULGE, size))
+            else:
+                energy.append(loop_initiation(INTERIOR, size) +
+                              min(MAX_ASYMMETRY, ASYMMETRY * abs(p - q)))
+    left, right = np.array(left), np.array(right)
+    # stacks and single nucleotide bulges keep stacking of adjacent pairs
+    stacked = left + right <= 1
+    return left, right, np.array(energy, dtype=np.int64), stacked
+
+
+PAIR_TYPE, STACK, TERMINAL_PENALTY, INTERIOR_PENALTY = pair_tables()
+LOOP_LEFT, LOOP_RIGHT, LOOP_ENERGY, LOOP_STACKED = loop_tables()
+HAIRPIN_ENERGY = np.array(
+    [INF] * MIN_HAIRPIN +
+    [loop_initiation(HAIRPIN, size) for size in range(MIN_HAIRPIN, 10 ** 4)],
+    dtype=np.int64
+)
+
+
+def encode(sequence):
+    """Translates sequence to array of base numbers,
+    unknown letters get the number of non-pairing base"""
+    sequence = str(sequence).upper().replace('T', 'U')
+    return np.array([BASES.find(base) if base in BASES else len(BASES)
+                     for base in sequence], dtype=np.int64)
+
+
+def interior_energies(V, pair_type, i, j):
+    """Energies of stacks, bulges and interior loops closed by pairs
+    (i, j) and inner pairs (k, l), returns matrix of energies and indices
+    of inner pairs, one row for every (i, j)"""
+    n = len(pair_type) - 1
+    k = i[:, None] + 1 + LOOP_LEFT[None, :]
+    l = j[:, None] - 1 - LOOP_RIGHT[None, :]
+    fits = l - k > MIN_HAIRPIN
+    k, l = np.where(fits, k, n), np.where(fits, l, n)
+
+    outer, inner = pair_type[i, j][:, None], pair_type[k, l]
+    energy = np.where(LOOP_STACKED[None, :], STACK[outer, inner],
+                      INTERIOR_PENALTY[outer] + INTERIOR_PENALTY[inner])
+    return V[k, l] + LOOP_ENERGY[None, :] + energy, k, l
+
+
+def multi_energies(WM, pair_type, i, j):
+    """Energies of multiloops closed by pairs (i, j) split at u into
+    WM[i + 1, u] and WM[u + 1, j - 1], returns matrix of energies and u"""
+    u = i[:, None] + 1 + np.arange(max(j[0] - i[0] - 2, 0))[None, :]
+    energy = (WM[i[:, None] + 1, u] + WM[u + 1, j[:, None] - 1] +
+              MULTI_A + MULTI_C + TERMINAL_PENALTY[pair_type[i, j]][:, None])
+    return energy, u
+
+
+def branch_energies(WM, i, j):
+    """Energies of multiloop parts [i, j] split at k
+    into WM[i, k] and WM[k + 1, j], returns matrix of energies and k"""
+    k = i[:, None] + np.arange(j[0] - i[0])[None, :]
+    return WM[i[:, None], k] + WM[k + 1, j[:, None]], k
+
+
+def row_min(energy, size):
+    """Minimum of every row, INF for empty rows"""
+    if energy.shape[1] == 0:
+        return np.full(size, INF, dtype=np.int64)
+    return energy.min(axis=1)
+
+
+def fill(codes):
+    """Fills matrices V (structures closed by pair i, j) and WM (parts
+    of multiloops), the last row and column of both stay INF"""
+    n = len(codes)
+    padded = np.append(codes, len(BASES))
+    pair_type = PAIR_TYPE[padded[:, None], padded[None, :]]
+    V = np.full((n + 1, n + 1), INF, dtype=np.int64)
+    WM = np.full((n + 1, n + 1), INF, dtype=np.int64)
+
+    for span in range(MIN_HAIRPIN + 1, n):
+        i = np.arange(n - span)
+        j = i + span
+        outer = pair_type[i, j]
+
+        # only nucleotides which can pair close structures
+        pi, pj = i[outer > 0], j[outer > 0]
+        if len(pi):
+            best = HAIRPIN_ENERGY[span - 1] + \
+                TERMINAL_PENALTY[pair_type[pi, pj]]
+            best = np.minimum(best, row_min(
+                interior_energies(V, pair_type, pi, pj)[0], len(pi)))
+            best = np.minimum(best, row_min(
+                multi_energies(WM, pair_type, pi, pj)[0], len(pi)))
+            best[best >= INF // 2] = INF
+            V[pi, pj] = best
+
+        wm = np.minimum(V[i, j] + MULTI_C + TERMINAL_PENALTY[outer],
+                        np.minimum(WM[i + 1, j], WM[i, j - 1]) + MULTI_B)
+        wm = np.minimum(wm, row_min(branch_energies(WM, i, j)[0], len(i)))
+        wm[wm >= INF // 2] = INF
+        WM[i, j] = wm
+
+    return pair_type, V, WM
+
+
+def exterior(pair_type, V):
+    """F[j] is the minimum energy of the first j nucleotides"""
+    n = len(V) - 1
+    F = np.zeros(n + 1, dtype=np.int64)
+    for j in range(n):
+        i = np.arange(j + 1)
+        closed = F[i] + V[i, j] + TERMINAL_PENALTY[pair_type[i, j]]
+        F[j + 1] = min(F[j], closed.min())
+    return F
+
+
+def traceback(pair_type, V, WM, F):
+    """Returns list with index of paired nucleotide for every
+    nucleotide (-1 for unpaired ones)"""
+    n = len(F) - 1
+    pairs = [-1] * n
+    stack = [('F', 0, n - 1)]
+    while stack:
+        kind, i, j = stack.pop()
+        if kind == 'F':
+            if j < 0:
+                continue
+            if F[j + 1] == F[j]:
+                stack.append(('F', 0, j - 1))
+                continue
+            for k in range(j + 1):
+                if F[k] + V[k, j] + TERMINAL_PENALTY[pair_type[k, j]] == \
+                        F[j + 1]:
+                    stack.extend([('F', 0, k - 1), ('V', k, j)])
+                    break
+
+        elif kind == 'V':
+            pairs[i], pairs[j] = j, i
+            energy = V[i, j]
+            ii, jj = np.array([i]), np.array([j])
+            if HAIRPIN_ENERGY[j - i - 1] + \
+                    TERMINAL_PENALTY[pair_type[i, j]] == energy:
+                continue
+            loops, k, l = interior_energies(V, pair_type, ii, jj)
+            found = np.flatnonzero(loops[0] == energy)
+            if len(found):
+                stack.append(('V', k[0, found[0]], l[0, found[0]]))
+                continue
+            loops, u = multi_energies(WM, pair_type, ii, jj)
+            found = np.flatnonzero(loops[0] == energy)[0]
+            stack.extend([('WM', i + 1, u[0, found]),
+                          ('WM', u[0, found] + 1, j - 1)])
+
+        else:
+            energy = WM[i, j]
+            if V[i, j] + MULTI_C + TERMINAL_PENALTY[pair_type[i, j]] == \
+                    energy:
+                stack.append(('V', i, j))
+            elif WM[i + 1, j] + MULTI_B == energy:
+                stack.append(('WM', i + 1, j))
+            elif WM[i, j - 1] + MULTI_B == energy:
+                stack.append(('WM', i, j - 1))
+            else:
+                parts, k = branch_energies(WM, np.array([i]), np.array([j]))
+                found = np.flatnonzero(parts[0] == energy)[0]
+                stack.extend([('WM', i, k[0, found]),
+                              ('WM', k[0, found] + 1, j)])
+    return pairs
+
+
+def fold(sequence):
+    """Folds sequence into its minimum free energy structure
+
+    input: string
+    output: float (kcal/mol), list of partner indices (-1 for unpaired)"""
+    codes = encode(sequence)
+    pair_type, V, WM = fill(codes)
+    F = exterior(pair_type, V)
+    return F[-1] / 100.0, traceback(pair_type, V, WM, F)
+
+
+def fold_pairs(sequence):
+    """Folds sequence and returns pairs in the same format as parse_ss
+
+    input: string
+    output: list of [position, pair] lists, numbered from 1, 0 for unpaired"""
+    energy, pairs = fold(sequence)
+    return [[position, pair + 1] for position, pair in enumerate(pairs, 1)]
@@ -1,46 +1,291 @@
 """
-Functions for getting data from RESTful API
+Functions for getting data from RESTful API and folding sequences
 """
 
 import os
-from datetime import datetime
+import tempfile
 import logging
+import time
+import threading
+from hashlib import sha1
+from collections import OrderedDict
+from cStringIO import StringIO
 
-import urllib2
 import json
-from zipfile import ZipFile
+from zipfile import ZipFile, BadZipfile
 
+from client import client, ClientError
+from ss import parse_ss_lines
 
-# URL = 'http://150.254.78.155:5000/mfold'
-URL = 'http://127.0.0.1:5000/mfold'
 
-HEADERS = {'content-type': 'application/json'}
+# paths relative to base url of the API (client.BASE_URL)
+URL = 'mfold'
+BATCH_URL = URL + '/batch'
+
+# memo of folded structures: switch, max number of entries kept in memory,
+# time to live in seconds and directory of the optional on-disk store
+MEMO_ENABLED = True
+MEMO_SIZE = 1024
+MEMO_TTL = 24 * 60 * 60
+MEMO_PATH = os.environ.get('SHMIR_MEMO_PATH')
+
+# default fold backend, 'mfold' (RESTful API) or 'mfe' (in-process)
+BACKEND = os.environ.get('SHMIR_FOLD_BACKEND', 'mfold')
+
+# directory of pdf files, one file per folded sequence
+PDF_PATH = os.environ.get('SHMIR_PDF_PATH', 'mfold_files')
+
+
+class FoldMemo(object):
+    """Two-tier memo of folded structures keyed by sequence hash:
+    in-process LRU and optional directory with one json file per sequence"""
+    def __init__(self, size=MEMO_SIZE, ttl=MEMO_TTL, path=MEMO_PATH):
+        self.size = size
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(sequence, backend):
+        """Returns hash of the sequence and name of fold backend"""
+        return sha1('%s:%s' % (backend, sequence.upper())).hexdigest()
+
+    def get(self, sequence, backend=BACKEND):
+        """Returns copy of memoized [pdf, ss pairs] or None"""
+        key = self.key(sequence, backend)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                entry = self.load(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                return None
+            self.entries[key] = entry
+        created, pdf, pairs = entry
+        return [pdf, [list(pair) for pair in pairs]]
+
+    def put(self, sequence, pdf, pairs, backend=BACKEND):
+        """Memoizes pdf file name and ss pairs of the sequence"""
+        key = self.key(sequence, backend)
+        entry = (time.time(), pdf, [list(pair) for pair in pairs])
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+            self.dump(key, entry)
+
+    def load(self, key):
+        """Reads entry from the on-disk store"""
+        if not self.path:
+            return None
+        try:
+            with open(os.path.join(self.path, key + '.json')) as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if entry['pdf'] and not os.path.exists(entry['pdf']):
+            return None
+        return entry['time'], entry['pdf'], entry['ss']
+
+    def dump(self, key, entry):
+        """Writes entry to the on-disk store"""
+        if not self.path:
+            return
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        created, pdf, pairs = entry
+        fd, tmp_name = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'time': created, 'pdf': pdf, 'ss': pairs}, f)
+        os.rename(tmp_name, os.path.join(self.path, key + '.json'))
+
+    def clear(self):
+        """Empties the in-process memo"""
+        with self.lock:
+            self.entries.clear()
+
+
+memo = FoldMemo()
 
 
 def mfold(data=None):
     """Input: sequence string
     Output: list of files downloaded from RESTful API"""
-    json_data = {'data': data}
+    files = download({'data': data}, URL)
+    if 'error' in files:
+        return files
+    return sorted(files)
 
-    req = urllib2.Request(URL, json.dumps(json_data), HEADERS)
 
-    directory = "mfold_files/"
-    current_datetime = datetime.now().strftime('%H:%M:%S-%d-%m-%y')
-    new_zip = os.path.join(os.path.dirname(__file__), directory,
-                           'newzip_'+current_datetime+'.zip')
+def fold(data, use_memo=None, pdf=True, backend=None):
+    """Folds sequence with the backend (BACKEND by default), memoized
+    results are returned without folding; use_memo=False bypasses the memo.
+    If pdf is False no pdf is created and None is returned instead
+    of its name
+    Input: sequence string
+    Output: list of pdf file name and pairs parsed from ss file"""
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        return {'error': 'Unknown fold backend %s' % backend}
+    if use_memo is None:
+        use_memo = MEMO_ENABLED
+    if use_memo:
+        result = memo.get(data, backend)
+        if result is not None and (not pdf or result[0] and
+                                   os.path.exists(result[0])):
+            return result
+
+    result = BACKENDS[backend](data, pdf)
+    if 'error' in result:
+        return result
+    if use_memo:
+        memo.put(data, result[0], result[1], backend)
+    return result
 
-    if not os.path.exists(directory):
-        os.makedirs(directory)
 
+def fold_mfold(data, pdf=True):
+    """Backend folding sequence by mfold through RESTful API.
+    The answer is unzipped in memory. If pdf is False the API skips
+    creating pdf, otherwise pdf file is written to PDF_PATH (see save_pdf)
+    Input: sequence string
+    Output: list of pdf file name and pairs parsed from ss file"""
+    answer = fetch({'data': data, 'pdf': pdf}, URL)
+    if isinstance(answer, dict):
+        return answer
     try:
-        with open(new_zip, "wb") as f:
-            f.write(urllib2.urlopen(req).read())
-    except urllib2.URLError:
+        zip_file = ZipFile(StringIO(answer))
+    except BadZipfile:
+        return answer_error(answer)
+    with zip_file:
+        names = zip_file.namelist()
+        ss_names = [name for name in names if name.endswith('.ss')]
+        if not ss_names:
+            logging.error('No ss file in the answer of mfold server')
+            return {'error': 'No ss file in the answer of mfold server'}
+        pairs = parse_ss_lines(zip_file.read(ss_names[-1]).splitlines())
+        pdf_file = None
+        for name in names:
+            if name.endswith('.pdf') and pdf:
+                pdf_file = save_pdf(data, zip_file.read(name))
+    return [pdf_file, pairs]
+
+
+def fold_mfe(data, pdf=True):
+    """Backend folding sequence in process by minimum free energy
+    algorithm from mfe module (requires numpy); it never creates pdf
+    Input: sequence string
+    Output: list of None and pairs in the same format as parse_ss"""
+    from mfe import fold_pairs
+    return [None, fold_pairs(data)]
+
+
+def register_backend(name, backend):
+    """Adds fold backend, a function which takes sequence and pdf flag
+    and returns list of pdf file name (or None) and pairs"""
+    BACKENDS[name] = backend
+
+
+BACKENDS = {
+    'mfold': fold_mfold,
+    'mfe': fold_mfe,
+}
+
+
+def mfold_many(data):
+    """Folds all sequences in one request to RESTful API
+    Input: list of sequence strings
+    Output: list of lists of files, one list for every sequence"""
+    files = download({'data': data}, BATCH_URL)
+    if 'error' in files:
+        return files
+
+    results = [[] for _ in data]
+    for file_name in files:
+        index = os.path.basename(os.path.dirname(file_name))
+        results[int(index)].append(file_name)
+    return [sorted(result) for result in results]
+
+
+def fetch(json_data, url, timeout=None):
+    """Sends json data to RESTful API and returns the answer,
+    error dict when the answer has other status than 200
+    (503 when the mfold queue of the server is full). Folding changes
+    nothing on the server, so the request may be sent again"""
+    try:
+        response = client.post_json(url, json_data, timeout,
+                                    idempotent=True)
+    except ClientError:
         logging.error('Connection to mfold server refused')
         return {'error': 'Connection to mfold server refused'}
-    files = get_list(new_zip, directory)
+    if response.status == 503:
+        error = 'Mfold server is busy, try again in %s seconds' % \
+            response.headers.get('retry-after', 'a few')
+        logging.error(error)
+        return {'error': error}
+    if response.status != 200:
+        logging.error('Mfold server answered with status %d', response.status)
+        return {'error': 'Mfold server answered with status %d'
+                % response.status}
+    return response.body
+
+
+def answer_error(answer):
+    """Error dict of the answer which is not a zip file,
+    the error given by RESTful API when the answer is json"""
+    try:
+        error = json.loads(answer)['error']
+    except (ValueError, TypeError, KeyError):
+        error = 'Mfold server answered with no zip file'
+    logging.error(error)
+    return {'error': error}
+
+
+def make_directory(directory="mfold_files/"):
+    """Creates the directory unless it exists and returns its name"""
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+    return directory
+
+
+def save_pdf(data, content, directory=None):
+    """Writes pdf of folded sequence to the directory (PDF_PATH by default)
+    under the hash of the sequence, so folds of the same sequence share
+    one file instead of leaving new one behind every time. The file
+    is renamed into place, concurrent folds never see half-written pdf
+    Input: sequence string, pdf content
+    Output: pdf file name"""
+    directory = make_directory(directory or PDF_PATH)
+    pdf_file = os.path.join(directory, FoldMemo.key(data, 'mfold') + '.pdf')
+    handle, temp_file = tempfile.mkstemp(dir=directory, suffix='.part')
+    with os.fdopen(handle, 'wb') as f:
+        f.write(content)
+    os.rename(temp_file, pdf_file)
+    return pdf_file
+
+
+def download(json_data, url):
+    """Sends json data to RESTful API, unzips the answer to new directory
+    and returns list of files; the caller removes the directory"""
+    answer = fetch(json_data, url)
+    if isinstance(answer, dict):
+        return answer
+
+    try:
+        ZipFile(StringIO(answer)).close()
+    except BadZipfile:
+        return answer_error(answer)
+
+    extract_to = tempfile.mkdtemp(dir=make_directory()) + os.sep
+    new_zip = os.path.join(extract_to, 'newzip.zip')
+    with open(new_zip, "wb") as f:
+        f.write(answer)
+    files = get_list(new_zip, extract_to)
     os.remove(new_zip)
-    return sorted(files)
+    return files
 
 
 def get_list(file_path, extract_to):
@@ -1,28 +1,421 @@
-from Bio.Blast import NCBIWWW, NCBIXML
-import cStringIO
-
-
-
-def Blast_offtarget(fasta_string):
-    result_handle = NCBIWWW.qblast("blastn", "refseq_rna", fasta_string, entrez_query="txid9606 [ORGN]", megablast=True)
-    blast_results = result_handle.read()
-    blast_in = cStringIO.StringIO(blast_results)
-    for record in NCBIXML.parse(blast_in):
-        print "QUERY: %s" % record.query
-        for align in record.alignments :
-            print " MATCH: %s..." % align.title[:60]
-            for hsp in align.hsps :
-                print " HSP, e=%f, from position %i to %i" \
-                    % (hsp.expect, hsp.query_start, hsp.query_end)
-                if hsp.align_length < 60 :
-                     print "  Query: %s" % hsp.query
-                     print "  Match: %s" % hsp.match
-                     print "  Sbjct: %s" % hsp.sbjct
-                else :
-                     print "  Query: %s..." % hsp.query[:57]
-                     print "  Match: %s..." % hsp.match[:57]
-                     print "  Sbjct: %s..." % hsp.sbjct[:57]
-    print "Done"
-    
-    
-fasta_string="TTGCTGTGTGAGGCAGAACCTGCGGGGGCAGGGGCGGGCTGGTTCCCTGGCCAGCCATTGGCAGAGTCCG"
+"""
+.. module:: offtarget
+    :synopsis: This module provides search of off-targets of siRNA.
+
+Seed matches are searched locally in SeedIndex built over transcriptome
+FASTA file. Seed (nucleotides 2-8 of guide strand by default) of siRNA
+pairs with a site in mRNA which is its reverse complement, so the index
+keeps positions of every k-mer of transcripts grouped by k-mer code.
+The index is a directory of .npy files read as memory-mapped arrays:
+* offsets.npy - positions of k-mer code c are positions[offsets[c]:
+  offsets[c + 1]],
+* positions.npy - positions in all transcripts joined together,
+* starts.npy - position of the first nucleotide of every transcript
+  (and the length of all of them at the end),
+* records.json - ids of transcripts.
+"""
+
+import os
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from search import read_fasta, CHUNK_SIZE
+from sequence import encode, kmer_codes, UNKNOWN
+
+
+# seed starts at the second nucleotide of guide strand
+SEED_START = 1
+SEED_LENGTH = 7
+MIN_SEED_LENGTH = 6
+MAX_SEED_LENGTH = 8
+
+# code of nucleotide paired with letter of seed
+SITE_CODES = dict((letter, 3 - code) for code, letters in
+                  enumerate(['Aa', 'Cc', 'Gg', 'TtUu']) for letter in letters)
+
+# result of search of one guide strand in any index, hits are
+# (id of transcript, position of site numbered from 1, mismatches)
+OffTargets = namedtuple('OffTargets', ['guide', 'site', 'count', 'hits',
+                                       'records'])
+
+# default number of mismatches of full-length matches, symbols of FM-index
+# text (terminal, A, C, G, T, separator) and rows between checkpoints
+MISMATCHES = 2
+SYMBOLS = 6
+SEPARATOR_CODES = np.array([5], dtype=np.uint8)
+OCC_STEP = 32
+# guides searched together (memory of search grows with their number)
+SEARCH_BATCH = 256
+
+# words with the highest bits of rows before the row in word set,
+# number of bits set in every 16 bit number
+WORD_MASKS = np.array([(2 ** OCC_STEP - 1) ^ (2 ** (OCC_STEP - rows) - 1)
+                       for rows in range(OCC_STEP + 1)], dtype=np.uint32)
+POPCOUNT = np.array([bin(number).count('1') for number in range(2 ** 16)],
+                    dtype=np.uint8)
+
+
+class SeedIndex(object):
+    """Positions of all seed sized k-mers of transcriptome,
+    arrays are memory-mapped from the index directory"""
+
+    def __init__(self, path):
+        """Opens index built by SeedIndex.build"""
+        self.path = path
+        self.offsets = np.load(os.path.join(path, 'offsets.npy')).tolist()
+        self.positions = np.load(os.path.join(path, 'positions.npy'),
+                                 mmap_mode='r')
+        self.starts = np.load(os.path.join(path, 'starts.npy'))
+        with open(os.path.join(path, 'records.json')) as f:
+            self.records = json.load(f)
+        self.seed_length = int(np.log2(len(self.offsets) - 1)) // 2
+
+    @classmethod
+    def build(cls, fasta, path, seed_length=SEED_LENGTH,
+              chunk_size=CHUNK_SIZE):
+        """Builds index of transcriptome in two passes over the file,
+        so memory does not depend on size of transcriptome
+
+        input: path of FASTA file, path of index directory, int, int
+        output: SeedIndex"""
+        if not MIN_SEED_LENGTH <= seed_length <= MAX_SEED_LENGTH:
+            raise ValueError('seed length must be between %d and %d' % (
+                MIN_SEED_LENGTH, MAX_SEED_LENGTH))
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        # first pass counts k-mers and lengths of transcripts
+        counts = np.zeros(4 ** seed_length, dtype=np.int64)
+        records, starts = [], []
+        for kmers, positions in cls.kmers(fasta, seed_length, chunk_size,
+                                          records, starts):
+            counts += np.bincount(kmers, minlength=len(counts))
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        total = starts.pop()
+        dtype = np.uint32 if total <= np.iinfo(np.uint32).max else np.uint64
+        stored = np.lib.format.open_memmap(
+            os.path.join(path, 'positions.npy'), mode='w+', dtype=dtype,
+            shape=(int(offsets[-1]),))
+
+        # second pass puts positions of every k-mer in order of positions
+        cursor = offsets[:-1].copy()
+        for kmers, positions in cls.kmers(fasta, seed_length, chunk_size):
+            order = np.argsort(kmers, kind='mergesort')
+            kmers, positions = kmers[order], positions[order]
+            codes, first, sizes = np.unique(kmers, return_index=True,
+                                            return_counts=True)
+            rank = np.arange(len(kmers)) - np.repeat(first, sizes)
+            stored[cursor[kmers] + rank] = positions
+            cursor[codes] += sizes
+        stored.flush()
+        del stored
+
+        np.save(os.path.join(path, 'offsets.npy'), offsets)
+        np.save(os.path.join(path, 'starts.npy'),
+                np.array(starts + [total], dtype=np.int64))
+        with open(os.path.join(path, 'records.json'), 'w') as f:
+            json.dump(records, f)
+        return cls(path)
+
+    @staticmethod
+    def kmers(fasta, seed_length, chunk_size, records=None, starts=None):
+        """Reads k-mer codes of FASTA file in chunks, k-mers with unknown
+        letters are skipped; ids and starts of transcripts are appended
+        to records and starts (with the length of all at the end)
+
+        input: path of FASTA file, int, int, list, list
+        output: generator of (k-mer codes, positions) numpy arrays"""
+        start, length, tail = 0, 0, np.zeros(0, dtype=np.uint8)
+        with open(fasta) as stream:
+            for record, position, chunk in read_fasta(stream, chunk_size):
+                if position == 0:
+                    # k-mers never span two transcripts
+                    start, length, tail = start + length, 0, tail[:0]
+                    if records is not None:
+                        records.append(record)
+                        starts.append(start)
+                codes = np.concatenate((tail, encode(chunk)))
+                kmers = kmer_codes(codes, seed_length)
+                found = np.flatnonzero(kmers >= 0)
+                yield kmers[found], found + (start + position - len(tail))
+                tail = codes[max(len(codes) - seed_length + 1, 0):]
+                length = position + len(chunk)
+        if starts is not None:
+            starts.append(start + length)
+
+    def site(self, guide, seed_start=SEED_START):
+        """Target site of seed of guide strand (reverse complement
+        of seed) as k-mer code, -1 when it has unknown letters
+
+        input: string
+        output: int"""
+        seed = guide[seed_start:seed_start + self.seed_length]
+        if len(seed) != self.seed_length:
+            return -1
+        code = 0
+        for letter in reversed(seed):
+            nucleotide = SITE_CODES.get(letter)
+            if nucleotide is None:
+                return -1
+            code = code * 4 + nucleotide
+        return code
+
+    def count(self, guide):
+        """Number of seed matches of guide strand in transcriptome"""
+        code = self.site(guide)
+        if code < 0:
+            return 0
+        return int(self.offsets[code + 1] - self.offsets[code])
+
+    def search(self, guide):
+        """Seed matches of guide strand (5'-3', T or U)
+
+        input: string
+        output: OffTargets (guide, site, count, hits - list of (id of
+        transcript, position of site numbered from 1, 0 mismatches),
+        records - dictionary of numbers of hits in every transcript)"""
+        code = self.site(guide)
+        if code < 0:
+            return OffTargets(guide, '', 0, [], {})
+        positions = np.asarray(
+            self.positions[self.offsets[code]:self.offsets[code + 1]],
+            dtype=np.int64)
+        numbers = np.searchsorted(self.starts, positions, side='right') - 1
+        names = self.records
+        hits = zip(map(names.__getitem__, numbers.tolist()),
+                   (positions - self.starts[numbers] + 1).tolist(),
+                   [0] * len(positions))
+        found, counts = np.unique(numbers, return_counts=True)
+        records = dict((names[number], count) for number, count in
+                       zip(found.tolist(), counts.tolist()))
+        site = ''.join('ACGT'[code >> 2 * shift & 3]
+                       for shift in range(self.seed_length - 1, -1, -1))
+        return OffTargets(guide, site, len(hits), hits, records)
+
+    def search_batch(self, guides):
+        """Seed matches of all guide strands
+
+        input: list of strings
+        output: list of OffTargets"""
+        return [self.search(guide) for guide in guides]
+
+
+class FMIndex(object):
+    """FM-index of transcriptome for full-length matches of guide strands
+    with mismatches. Transcripts are joined with separators into one text
+    (A=1, C=2, G=3, T/U=4, separator and unknown letters 5, terminal 0).
+    Burrows-Wheeler transform is kept as bit vectors of A, C, G and T
+    in 32 bit words (words.npy) with counts of nucleotides before every
+    word (occ.npy) for backward search, suffix array (sa.npy) is read only
+    to find positions of matches; all of them are memory-mapped from
+    the index directory (with first.npy, starts.npy and records.json)."""
+
+    def __init__(self, path):
+        """Opens index built by FMIndex.build"""
+        self.path = path
+        self.words = np.load(os.path.join(path, 'words.npy'), mmap_mode='r')
+        self.occ = np.load(os.path.join(path, 'occ.npy'), mmap_mode='r')
+        self.sa = np.load(os.path.join(path, 'sa.npy'), mmap_mode='r')
+        self.first = np.load(os.path.join(path, 'first.npy'))
+        self.starts = np.load(os.path.join(path, 'starts.npy'))
+        with open(os.path.join(path, 'records.json')) as f:
+            self.records = json.load(f)
+
+    @classmethod
+    def build(cls, fasta, path, chunk_size=CHUNK_SIZE):
+        """Builds index of transcriptome, whole text and its suffix array
+        are kept in memory while building
+
+        input: path of FASTA file, path of index directory, int
+        output: FMIndex"""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        parts, records, starts, size = [], [], [], 0
+        with open(fasta) as stream:
+            for record, position, chunk in read_fasta(stream, chunk_size):
+                if position == 0:
+                    if records:
+                        parts.append(SEPARATOR_CODES)
+                        size += 1
+                    records.append(record)
+                    starts.append(size)
+                parts.append(encode(chunk) + 1)
+                size += len(chunk)
+        parts.append(np.zeros(1, dtype=np.uint8))
+        text = np.concatenate(parts)
+        del parts
+
+        sa = suffix_array(text)
+        bwt = text[sa - 1]
+        del text
+        # row len(bwt) is counted too, so there is one more word
+        blocks = len(bwt) // OCC_STEP + 1
+        words = np.zeros((blocks, 4), dtype=np.uint32)
+        occ = np.zeros((blocks, 4), dtype=np.int64)
+        for symbol in range(1, 5):
+            bits = np.zeros(blocks * OCC_STEP, dtype=bool)
+            bits[:len(bwt)] = bwt == symbol
+            # the first row of word is its highest bit
+            words[:, symbol - 1] = np.packbits(bits).view('>u4')
+            occ[1:, symbol - 1] = np.cumsum(
+                bits.reshape(blocks, OCC_STEP).sum(axis=1))[:-1]
+        totals = np.bincount(bwt, minlength=SYMBOLS)
+        dtype = np.uint32 if len(sa) <= np.iinfo(np.uint32).max else np.uint64
+
+        np.save(os.path.join(path, 'words.npy'), words)
+        np.save(os.path.join(path, 'occ.npy'), occ.astype(dtype))
+        np.save(os.path.join(path, 'sa.npy'), sa.astype(dtype))
+        np.save(os.path.join(path, 'first.npy'), np.cumsum(totals) - totals)
+        np.save(os.path.join(path, 'starts.npy'),
+                np.array(starts + [size], dtype=np.int64))
+        with open(os.path.join(path, 'records.json'), 'w') as f:
+            json.dump(records, f)
+        return cls(path)
+
+    def counts(self, rows):
+        """Number of every nucleotide (A, C, G, T) in BWT before rows
+
+        input: numpy array of rows
+        output: numpy array (rows, 4)"""
+        blocks = rows // OCC_STEP
+        words = self.words[blocks] & WORD_MASKS[rows - blocks * OCC_STEP, None]
+        return (self.occ[blocks].astype(np.int64) +
+                POPCOUNT[words & 0xffff] + POPCOUNT[words >> 16])
+
+    def intervals(self, sites, mismatches):
+        """Backward search of all sites at once, with every substitution
+        while the number of mismatches allows it; states of the search
+        (site, intervals of rows, mismatches) are expanded level by level
+
+        input: list of sites (numpy arrays of codes), int
+        output: numpy arrays of site numbers, first and last + 1 rows
+        and mismatches of every matching sequence"""
+        lengths = np.array([len(site) for site in sites], dtype=np.int64)
+        padded = np.zeros((len(sites), lengths.max() if len(sites) else 0),
+                          dtype=np.int64)
+        for number, site in enumerate(sites):
+            padded[number, :len(site)] = site
+
+        numbers = np.flatnonzero(lengths > 0)
+        low = np.zeros(len(numbers), dtype=np.int64)
+        high = np.full(len(numbers), len(self.sa), dtype=np.int64)
+        missed = np.zeros(len(numbers), dtype=np.int64)
+        found = []
+        symbols = np.arange(1, 5)
+        depth = 0
+        while len(numbers):
+            expected = padded[numbers, lengths[numbers] - 1 - depth]
+            first = self.first[symbols][None, :]
+            low_all = first + self.counts(low)
+            high_all = first + self.counts(high)
+            missed_all = missed[:, None] + (symbols[None, :] !=
+                                           expected[:, None])
+            keep = (low_all < high_all) & (missed_all <= mismatches)
+            state, symbol = np.nonzero(keep)
+            numbers, low, high, missed = (
+                numbers[state], low_all[state, symbol],
+                high_all[state, symbol], missed_all[state, symbol])
+            depth += 1
+            done = lengths[numbers] == depth
+            found.append((numbers[done], low[done], high[done],
+                          missed[done]))
+            numbers, low, high, missed = (numbers[~done], low[~done],
+                                          high[~done], missed[~done])
+        if not found:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty, empty
+        return tuple(np.concatenate(parts) for parts in zip(*found))
+
+    def search_batch(self, guides, mismatches=MISMATCHES,
+                     batch_size=SEARCH_BATCH):
+        """Transcripts matching full length of guide strands (5'-3', T or U)
+        with at most mismatches substitutions, batch_size guides are
+        searched together
+
+        input: list of strings, int, int
+        output: list of OffTargets (guide, site, count, hits - list of
+        (id of transcript, position of site numbered from 1, mismatches)
+        in order of mismatches, records - dictionary of numbers of hits
+        in every transcript)"""
+        results = []
+        for start in range(0, len(guides), batch_size):
+            results.extend(self.locate(guides[start:start + batch_size],
+                                       mismatches))
+        return results
+
+    def locate(self, guides, mismatches):
+        """Searches all guide strands at once, see search_batch"""
+        sites = []
+        for guide in guides:
+            site = encode(guide)[::-1]
+            known = site != UNKNOWN
+            site[known] = 3 - site[known]
+            # sites with unknown letters never match
+            sites.append(site + 1 if known.all() else site[:0])
+        numbers, low, high, missed = self.intervals(sites, mismatches)
+
+        results = []
+        order = np.lexsort((low, missed, numbers))
+        bounds = np.searchsorted(numbers[order], np.arange(len(guides) + 1))
+        names = self.records
+        for number, guide in enumerate(guides):
+            hits = []
+            for index in order[bounds[number]:bounds[number + 1]]:
+                positions = np.sort(np.asarray(
+                    self.sa[low[index]:high[index]], dtype=np.int64))
+                records = np.searchsorted(self.starts, positions,
+                                          side='right') - 1
+                hits.extend(zip(map(names.__getitem__, records.tolist()),
+                                (positions - self.starts[records] +
+                                 1).tolist(),
+                                [int(missed[index])] * len(positions)))
+            counted = {}
+            for hit in hits:
+                counted[hit[0]] = counted.get(hit[0], 0) + 1
+            site = ''.join('ACGT'[code - 1] for code in sites[number])
+            results.append(OffTargets(guide, site, len(hits), hits, counted))
+        return results
+
+    def search(self, guide, mismatches=MISMATCHES):
+        """Transcripts matching full length of guide strand, see
+        search_batch
+
+        input: string, int
+        output: OffTargets"""
+        return self.search_batch([guide], mismatches)[0]
+
+
+def suffix_array(text):
+    """Suffix array of text ending with unique smallest symbol,
+    sorted by prefix doubling starting from the first 8 symbols
+
+    input: numpy array of symbols (at most 7)
+    output: numpy array of int64"""
+    size = len(text)
+    padded = np.concatenate((text.astype(np.int64),
+                             np.zeros(8, dtype=np.int64)))
+    rank = np.zeros(size, dtype=np.int64)
+    for offset in range(8):
+        rank = rank << 3 | padded[offset:offset + size]
+    length = 8
+    while True:
+        second = np.zeros(size, dtype=np.int64)
+        second[:max(size - length, 0)] = rank[length:] + 1
+        # pair of ranks is sorted as one key when it fits in int64
+        scale = int(second.max()) + 1
+        if int(rank.max()) < 2 ** 62 // scale:
+            key = rank * scale + second
+            sa = np.argsort(key)
+            changed = np.diff(key[sa]) != 0
+        else:
+            sa = np.lexsort((second, rank))
+            changed = (np.diff(rank[sa]) != 0) | (np.diff(second[sa]) != 0)
+        rank = np.empty(size, dtype=np.int64)
+        rank[sa] = np.concatenate(([0], np.cumsum(changed)))
+        if rank[sa[-1]] == size - 1:
+            return sa
+        length *= 2
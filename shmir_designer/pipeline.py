@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+"""
+.. module:: pipeline
+    :synopsis: provides design of sh-miRs for whole transcripts
+
+Candidates (21 nt parts of mRNA) flow lazily through generator stages:
+windows -> validate -> score -> filter_immuno -> top -> annotate_immuno
+-> design.
+Only the cheap stages see every candidate; sh-miRs are designed
+(framed and folded) only for the few best ones.
+"""
+
+from collections import namedtuple
+from cStringIO import StringIO
+from heapq import nlargest
+from itertools import islice, izip
+from operator import attrgetter
+import json
+import sys
+
+from validators import SIRNA_PATTERN
+from utils import reverse_complement
+from search import read_fasta, ImmunoScanner, CHUNK_SIZE
+from sirna_rules import score_targets, SIRNA_LENGTH
+from backbone import get_immuno
+from main import design as design_sirna, FOLD_PROCESSES
+
+
+# number of candidates designed, candidates scored or searched at once
+# and the shortest immunostimulatory motif which rejects candidates
+TOP_K = 3
+BATCH_SIZE = 4096
+IMMUNO_MIN_LENGTH = 4
+
+# position is numbered from 1, target is the part of mRNA,
+# sirna is the antisense strand (validated like input of designer)
+Candidate = namedtuple('Candidate', ['record', 'position', 'target', 'sirna',
+                                     'score', 'immuno'])
+
+
+def batches(iterable, size=BATCH_SIZE):
+    """Splits iterable into lists of at most size elements"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def windows(mrna, chunk_size=CHUNK_SIZE):
+    """Enumerates all 21 nt parts of mRNA, FASTA file is read in chunks
+
+    input: string (sequence or FASTA) or FASTA file
+    output: generator of Candidate"""
+    stream = StringIO(mrna) if isinstance(mrna, basestring) else mrna
+    tail = ''
+    for record, position, chunk in read_fasta(stream, chunk_size):
+        # windows across chunks start in the end of the previous chunk
+        text = chunk if position == 0 else tail + chunk
+        offset = position - (len(text) - len(chunk))
+        for start in xrange(len(text) - SIRNA_LENGTH + 1):
+            yield Candidate(record, offset + start + 1,
+                            text[start:start + SIRNA_LENGTH],
+                            None, None, None)
+        tail = text[max(len(text) - SIRNA_LENGTH + 1, 0):]
+
+
+def validate(candidates):
+    """Rejects candidates whose antisense strand is not a correct input
+    (like in check_input_single, but ends are not cut as they are not
+    overhangs), the others get the strand
+
+    input: iterable of Candidate
+    output: generator of Candidate"""
+    for candidate in candidates:
+        sirna = reverse_complement(candidate.target.replace('U', 'T')).lower()
+        if SIRNA_PATTERN.match(sirna):
+            yield candidate._replace(sirna=sirna)
+
+
+def score(candidates, batch_size=BATCH_SIZE):
+    """Scores efficacy of candidates with siRNArules (PlusValue - NegValue)
+
+    input: iterable of validated Candidate
+    output: generator of Candidate"""
+    for batch in batches(candidates, batch_size):
+        plus, neg = score_targets([candidate.target for candidate in batch])
+        for candidate, value in izip(batch, plus - neg):
+            yield candidate._replace(score=int(value))
+
+
+def strands_motifs(scanner, candidates):
+    """Motifs found in both strands of every candidate"""
+    strands = []
+    for candidate in candidates:
+        strands.extend([candidate.sirna, reverse_complement(candidate.sirna)])
+    found = scanner.scan_batch(strands)
+    return [sorted(set(motif for _, motif in found[number] +
+                       found[number + 1]))
+            for number in range(0, len(found), 2)]
+
+
+def filter_immuno(candidates, motifs, min_length=IMMUNO_MIN_LENGTH,
+                  batch_size=BATCH_SIZE):
+    """Rejects candidates with immunostimulatory motifs of at least
+    min_length nucleotides in any strand (shorter motifs like GU are
+    in almost every siRNA)
+
+    input: iterable of validated Candidate, list of motifs, int
+    output: generator of Candidate"""
+    scanner = ImmunoScanner([motif for motif in motifs
+                             if len(motif) >= min_length])
+    for batch in batches(candidates, batch_size):
+        for candidate, found in izip(batch, strands_motifs(scanner, batch)):
+            if not found:
+                yield candidate
+
+
+def annotate_immuno(candidates, motifs):
+    """Candidates get the list of all immunostimulatory motifs
+    found in their strands
+
+    input: iterable of validated Candidate, list of motifs
+    output: generator of Candidate"""
+    scanner = ImmunoScanner(motifs)
+    for batch in batches(candidates):
+        for candidate, found in izip(batch, strands_motifs(scanner, batch)):
+            yield candidate._replace(immuno=found)
+
+
+def top(candidates, k=TOP_K):
+    """Keeps only k best scored candidates (the first of equal ones),
+    in order of scores
+
+    input: iterable of scored Candidate, int
+    output: generator of Candidate"""
+    for candidate in nlargest(k, candidates, key=attrgetter('score')):
+        yield candidate
+
+
+def design(candidates, processes=FOLD_PROCESSES):
+    """Designs sh-miRs of candidates (see main.design)
+
+    input: iterable of validated Candidate
+    output: generator of (Candidate, result of design)"""
+    for candidate in candidates:
+        yield candidate, design_sirna(candidate.sirna, '',
+                                      processes=processes)
+
+
+def run(mrna, k=TOP_K, processes=FOLD_PROCESSES):
+    """
+    Designs sh-miRs for k best siRNAs of whole mRNA. Single result
+    include the candidate (record, position, target, siRNA, score
+    and immunostimulatory motifs) and its sh-miRs like in main.
+    """
+    immuno = get_immuno()
+    if 'error' in immuno:
+        return immuno
+    motifs = [elem['sequence'] for elem in immuno]
+
+    candidates = top(filter_immuno(score(validate(windows(mrna))), motifs), k)
+    candidates = annotate_immuno(candidates, motifs)
+    results = []
+    for candidate, designed in design(candidates, processes):
+        if 'error' in designed:
+            return designed
+        result = candidate._asdict()
+        result['shmirs'] = designed['result']
+        results.append(result)
+    return {'result': results}
+
+
+if __name__ == '__main__':
+    if sys.argv[1:]:
+        with open(sys.argv[1]) as mrna:
+            print(json.dumps(run(mrna)))
+    else:
+        print(json.dumps(run(sys.stdin)))
@@ -3,22 +3,100 @@
     :synopsis: This module provides scroing frames.
 """
 
-from math import ceil
-from ss import parse_ss
-from ss import parse_score
+from collections import namedtuple
+from threading import Lock
 
+import numpy as np
 
-def score_frame(frame, frame_ss_file, orginal_frame):
-    """Frame is a tuple of object Backbone and two sequences
-    frame_ss_file is file from mfold
-    orignal_frame is object Backbone from database (not changed)
+from ss import parse_score
 
-    input: sh-miR object, ss_file, ss_file
-    output: int"""
 
+ScoreTemplate = namedtuple('ScoreTemplate', ['max_score', 'stride', 'keys',
+                                             'scores'])
+
+
+class ScoreTemplates(object):
+    """Scoring templates of backbones parsed once and kept in memory.
+    Every pair of template (number of nucleotide and its partner) is coded
+    as number * stride + partner; keys are the sorted codes of pairs and
+    scores the summed scores of every key, as integer arrays.
+    Templates are loaded again when the catalog of backbones changes."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.catalog = None
+        self.templates = {}
+
+    @staticmethod
+    def parse(structure):
+        """Parses score file of backbone structure
+
+        input: string (path of structure from database)
+        output: ScoreTemplate"""
+        max_score, data = parse_score(u'.' + structure)
+        pairs = np.array([pair for pair, _ in data],
+                         dtype=np.int64).reshape(-1, 2)
+        stride = int(pairs.max()) + 1 if len(pairs) else 1
+        keys, index = np.unique(pairs[:, 0] * stride + pairs[:, 1],
+                                return_inverse=True)
+        # the same pair given more than once counts with all its scores
+        scores = np.bincount(index, weights=[score for _, score in data],
+                             minlength=len(keys)).astype(np.int64)
+        return ScoreTemplate(max_score, stride, keys, scores)
+
+    def load(self, backbones):
+        """Loads templates of all backbones from catalog,
+        nothing is read if the catalog did not change
+
+        input: list of Backbone objects"""
+        catalog = frozenset((backbone.name, backbone.structure)
+                            for backbone in backbones)
+        with self.lock:
+            if catalog == self.catalog:
+                return
+        templates = dict((name, (structure, self.parse(structure)))
+                         for name, structure in catalog)
+        with self.lock:
+            self.catalog = catalog
+            self.templates = templates
+
+    def get(self, backbone):
+        """Returns template of backbone, parsing it on first use
+        or when its structure changed
+
+        input: Backbone object
+        output: ScoreTemplate"""
+        with self.lock:
+            structure, template = self.templates.get(backbone.name,
+                                                     (None, None))
+        if structure != backbone.structure:
+            template = self.parse(backbone.structure)
+            with self.lock:
+                self.templates[backbone.name] = (backbone.structure, template)
+        return template
+
+    def clear(self):
+        """Forgets all loaded templates"""
+        with self.lock:
+            self.catalog = None
+            self.templates = {}
+
+
+templates = ScoreTemplates()
+
+
+def shifts(frame, orginal_frame):
+    """The numbers assigned to the nucleotides have to be verified,
+    because flanking sequences can be shortened or extended during insertion.
+    Moreover, the length of the siRNA insert can differ from the natural one.
+    Returns shifts of the five segments of frame (flanks5, first insert,
+    loop, second insert, flanks3) in the order they are applied: numbers
+    of nucleotides from start are moved by value, pairs greater than
+    current are moved by value.
+
+    input: sh-miR object, original Backbone object
+    output: list of (start, current, value) tuples"""
     structure, seq1, seq2 = frame
-    structure_ss = parse_ss(frame_ss_file)
-    max_score, orginal_score = parse_score(u'.' + orginal_frame.structure)
 
     #differences
     flanks5 = len(orginal_frame.flanks5_s) - len(structure.flanks5_s)
@@ -28,39 +106,87 @@ def score_frame(frame, frame_ss_file, orginal_frame):
     flanks3 = len(orginal_frame.flanks3_s) - len(structure.flanks3_s)
 
     position = len(structure.flanks5_s)  # position in sequence (list)
-    structure_len = len(structure.template(seq1, seq2))
     current = position + flanks5  # current position (after changes)
 
     if flanks5 < 0:
-        add_shifts(0, structure_len, structure_ss, flanks5, 0)
+        result = [(0, 0, flanks5)]
     else:
-        add_shifts(position, structure_len,
-                   structure_ss, flanks5, current)
+        result = [(position, current, flanks5)]
     for diff, nucleotides in [(insertion1, seq1), (loop, structure.loop_s),
                               (insertion2, seq2), (flanks3, '')]:
         position += len(nucleotides)
-        current = position + diff
-        add_shifts(position, structure_len, structure_ss, diff, current)
-    score = 0
-    for shmir in structure_ss:
-        for template in orginal_score:
-            if shmir == template[0]:
-                score += template[1]
-    return int(ceil(score/max_score * 100))
-
-
-def add_shifts(start, end, frame_ss, value, current):
-    """The numbers assigned to the nucleotides have to be verified,
-    because flanking sequences can be shortened or extended during insertion.
-    Moreover, the length of the siRNA insert can differ from the natural one.
+        result.append((position, position + diff, diff))
+    return result
+
+
+def score_frames(frames, frames_ss, orginal_frames):
+    """Scores a batch of frames at once. Pairs of all frames are joined
+    into two arrays (numbers and pairs), segment shifts are applied to them
+    as arrays of offsets and matched against the templates by indexing
+    template arrays with the shifted numbers.
+
+    input: list of sh-miR objects, list of lists of pairs,
+    list of original Backbone objects
+    output: numpy array of ints"""
+    if not frames:
+        return np.zeros(0, dtype=int)
+
+    lengths = np.array([len(frame_ss) for frame_ss in frames_ss])
+    pairs = np.concatenate([np.array(frame_ss, dtype=np.int64).reshape(-1, 2)
+                            for frame_ss in frames_ss])
+    numbers, partners = pairs[:, 0], pairs[:, 1]
+    # index of nucleotide within its frame
+    index = np.arange(len(pairs)) - np.repeat(np.cumsum(lengths) - lengths,
+                                              lengths)
+    # applied one after another, pairs are compared with already moved values
+    frame_shifts = np.array([shifts(frame, orginal)
+                             for frame, orginal in zip(frames, orginal_frames)],
+                            dtype=np.int64)
+    for start, current, value in np.transpose(frame_shifts, (1, 2, 0)):
+        start, current, value = [np.repeat(column, lengths)
+                                 for column in (start, current, value)]
+        numbers += np.where(index >= start, value, 0)
+        partners += np.where((partners != 0) & (partners > current), value, 0)
+
+    # templates of used backbones joined into one sorted array of keys,
+    # keys of every template are moved past the keys of previous ones
+    bases, max_scores, template_keys, template_scores = {}, [], [], []
+    size = 0
+    for orginal in orginal_frames:
+        template = templates.get(orginal)
+        if orginal.name not in bases:
+            bases[orginal.name] = (size, template.stride)
+            template_keys.append(template.keys + size)
+            template_scores.append(template.scores)
+            size += template.stride ** 2
+        max_scores.append(template.max_score)
+    template_keys = np.concatenate(template_keys)
+    template_scores = np.concatenate(template_scores)
+    base, stride = np.array(
+        [bases[orginal.name] for orginal in orginal_frames]).T
+    base = np.repeat(base, lengths)
+    stride = np.repeat(stride, lengths)
+
+    valid = (numbers >= 0) & (numbers < stride) & \
+        (partners >= 0) & (partners < stride)
+    keys = base + numbers * stride + partners
+    lookup = np.minimum(np.searchsorted(template_keys, keys),
+                        len(template_keys) - 1)
+    matched = valid & (template_keys[lookup] == keys)
+    frame_number = np.repeat(np.arange(len(frames)), lengths)
+    score = np.bincount(frame_number, weights=template_scores[lookup] * matched,
+                        minlength=len(frames))
+    return np.ceil(score / np.array(max_scores) * 100).astype(int)
+
+
+def score_frame(frame, frame_ss, orginal_frame):
+    """Frame is a tuple of object Backbone and two sequences
+    frame_ss is list of pairs parsed from mfold ss file
+    orignal_frame is object Backbone from database (not changed)
 
-    input: start, end, frame_ss, value, current.
-    The function has no output"""
-    for num in range(end):
-        if num >= start:
-            frame_ss[num][0] += value
-        if frame_ss[num][1] != 0 and frame_ss[num][1] > current:
-            frame_ss[num][1] += value
+    input: sh-miR object, list of pairs, ss_file
+    output: int"""
+    return int(score_frames([frame], [frame_ss], [orginal_frame])[0])
 
 
 def score_homogeneity(original_frame):
@@ -3,40 +3,329 @@
     :synopsis: This module provides searching sequences.
 """
 
-from itertools import chain
+import heapq
 import re
+import sre_parse
+from bisect import bisect_right
+from sre_constants import MAXREPEAT
+from threading import Lock
 
+from backbone import get_immuno
 
-def findall_overlapping(pattern, string):
+# letters of sequence read at once by stream_by_patterns
+CHUNK_SIZE = 1024 * 1024
+
+
+def finditer_overlapping(pattern, string):
     """
     :param pattern: Pattern string.
     :type pattern: str.
     :param string: String in which we search.param
     :type string: str.
-    :returns: list -- all unique overlapping matches of pattern in string.
+    :returns: generator -- match objects of all overlapping matches
+        of pattern in string in order of their positions.
     """
     regex = re.compile(pattern)
-    results = []
     pos = 0
 
     while True:
         result = regex.search(string, pos)
         if not result:
             break
-        results.append(result.group())
+        yield result
         pos = result.start() + 1
-    return list(set(results))
+
+
+def overlapping_matches(pattern, string):
+    """
+    :param pattern: Pattern string.
+    :type pattern: str.
+    :param string: String in which we search.param
+    :type string: str.
+    :returns: list -- all overlapping matches of pattern in string
+        in order of their positions.
+    """
+    return [result.group()
+            for result in finditer_overlapping(pattern, string)]
+
+
+def findall_overlapping(pattern, string):
+    """
+    :param pattern: Pattern string.
+    :type pattern: str.
+    :param string: String in which we search.param
+    :type string: str.
+    :returns: list -- all unique overlapping matches of pattern in string.
+    """
+    return list(set(overlapping_matches(pattern, string)))
+
+
+class PatternScanner(object):
+    """Patterns of find_by_patterns dict, every pattern compiled once
+    and searched with finditer_overlapping (the search skips positions
+    at which the pattern cannot start, which is faster than checking
+    all patterns at every position of the sequence).
+    """
+
+    def __init__(self, patterns):
+        """
+        :param patterns: Dict of patterns.
+        :type patterns: dict.
+        """
+        self.patterns = [(key, pattern)
+                         for key, patt_list in patterns.items()
+                         for pattern in patt_list]
+        self.keys = patterns.keys()
+        self.regexes = [re.compile(pattern) for _, pattern in self.patterns]
+
+    def _hits(self, index, sequence):
+        """Matches of one pattern"""
+        for result in finditer_overlapping(self.regexes[index], sequence):
+            yield result.start(), index, result.group()
+
+    def hits(self, sequence):
+        """
+        :param sequence: Sequence in which we search.
+        :type sequence: str.
+        :returns: generator -- (start, index of pattern, match) of all
+            matches in order of their starts and indexes of patterns.
+        """
+        return heapq.merge(*[self._hits(index, sequence)
+                             for index in range(len(self.patterns))])
+
+    def scan(self, sequence):
+        """
+        :param sequence: Sequence in which we search.
+        :type sequence: str.
+        :returns: list -- lists of matches of every pattern in order
+            of their positions in the sequence.
+        """
+        return [overlapping_matches(regex, sequence)
+                for regex in self.regexes]
+
+    def max_length(self):
+        """
+        :returns: int -- length of the longest possible match.
+        :raises: ValueError -- when length of matches is not limited.
+        """
+        lengths = []
+        for _, pattern in self.patterns:
+            length = sre_parse.parse(pattern).getwidth()[1]
+            if length >= MAXREPEAT:
+                raise ValueError('Length of matches of %s is not limited'
+                                 % pattern)
+            lengths.append(length)
+        return max(lengths or [0])
+
+    def find(self, sequence):
+        """
+        :param sequence: Sequence in which we search.
+        :type sequence: str.
+        :returns: dict -- all unique sequences found by every pattern,
+            joined for patterns of the same key.
+        """
+        results = dict((key, []) for key in self.keys)
+        for (key, _), found in zip(self.patterns, self.scan(sequence)):
+            results[key].extend(list(set(found)))
+        return results
 
 
 def find_by_patterns(patterns, mRNA):
-    """This function search for patterns in mRNA
+    """This function search for patterns in mRNA (see PatternScanner)
     :param patterns: Dict of patterns.
     :type patterns: dict.
     :param mRNA: mRNA sequnece.
     :type mRNA: str.
     :returns: dict -- all sequences found by patterns.
     """
-    return {
-        key: list(chain(*(findall_overlapping(pattern, mRNA) for pattern in patt_list)))
-        for key, patt_list in patterns.items()
-    }
+    return PatternScanner(patterns).find(mRNA)
+
+
+def read_fasta(stream, chunk_size=CHUNK_SIZE):
+    """Reads FASTA records lazily, at most chunk_size letters at a time;
+    line breaks and whitespace are dropped, letters are uppercased.
+    :param stream: FASTA file.
+    :type stream: file.
+    :param chunk_size: Number of letters of the longest chunk.
+    :type chunk_size: int.
+    :returns: generator -- (record id, position of chunk, chunk).
+    """
+    record, position, parts, size = None, 0, [], 0
+    header, in_header, line_start = [], False, True
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            break
+        for number, piece in enumerate(block.split('\n')):
+            if number:
+                if in_header:
+                    words = ''.join(header).split()
+                    record = words[0] if words else ''
+                    in_header = False
+                line_start = True
+            if line_start and piece.startswith('>'):
+                if size:
+                    yield record, position, ''.join(parts)
+                position, parts, size = 0, [], 0
+                header, in_header = [piece[1:]], True
+            elif in_header:
+                header.append(piece)
+            elif piece:
+                letters = ''.join(piece.split()).upper()
+                parts.append(letters)
+                size += len(letters)
+                while size >= chunk_size:
+                    joined = ''.join(parts)
+                    yield record, position, joined[:chunk_size]
+                    position += chunk_size
+                    parts = [joined[chunk_size:]]
+                    size -= chunk_size
+            line_start = line_start and not piece
+    if parts and size:
+        yield record, position, ''.join(parts)
+
+
+def stream_by_patterns(patterns, stream, chunk_size=CHUNK_SIZE):
+    """This function search for patterns in all records of FASTA file
+    read in chunks, so memory does not depend on size of the file.
+    Every chunk is searched together with the end of previous one (as long
+    as the longest match), so matches across chunks are found too.
+    :param patterns: Dict of patterns (see find_by_patterns), their
+        matches must have limited length.
+    :type patterns: dict.
+    :param stream: FASTA file.
+    :type stream: file.
+    :param chunk_size: Number of letters read at once.
+    :type chunk_size: int.
+    :returns: generator -- (record id, position, key, match) of every
+        match, position is counted from 0 in the record.
+    """
+    scanner = PatternScanner(patterns)
+    overlap = max(scanner.max_length() - 1, 0)
+    record, offset, window = None, 0, ''
+
+    def window_hits(record, offset, window, final):
+        """Matches starting before the part of window searched again"""
+        limit = len(window) if final else len(window) - overlap
+        hits = sorted(hit for hit in scanner.hits(window) if hit[0] < limit)
+        for start, index, match in hits:
+            yield record, offset + start, scanner.patterns[index][0], match
+
+    for name, position, chunk in read_fasta(stream, chunk_size):
+        if name != record or position == 0:
+            for hit in window_hits(record, offset, window, True):
+                yield hit
+            record, offset, window = name, 0, ''
+        window += chunk
+        for hit in window_hits(record, offset, window, False):
+            yield hit
+        cut = max(len(window) - overlap, 0)
+        offset += cut
+        window = window[cut:]
+    for hit in window_hits(record, offset, window, True):
+        yield hit
+
+
+def motif_pattern(motif):
+    """Pattern of motif in which U and T are the same nucleotide
+    :param motif: Motif sequence.
+    :type motif: str.
+    :returns: str -- pattern.
+    """
+    return ''.join('[UT]' if letter in 'UT' else re.escape(letter)
+                   for letter in motif.upper())
+
+
+class ImmunoScanner(object):
+    """Immunostimulatory motifs compiled into one PatternScanner,
+    U and T are equivalent, sequences are searched case-insensitively.
+    """
+
+    def __init__(self, motifs):
+        """
+        :param motifs: Motif sequences.
+        :type motifs: list.
+        """
+        self.motifs = list(motifs)
+        self.scanner = PatternScanner(
+            dict((motif, [motif_pattern(motif)]) for motif in self.motifs))
+
+    def scan(self, sequence):
+        """
+        :param sequence: Sequence in which we search.
+        :type sequence: str.
+        :returns: list -- (position, motif) of every occurrence of motifs
+            in order of positions.
+        """
+        return sorted((start, self.scanner.patterns[index][0])
+                      for start, index, _ in self.scanner.hits(
+                          sequence.upper()))
+
+    def scan_batch(self, sequences):
+        """All sequences are joined and searched at once
+        :param sequences: Sequences in which we search.
+        :type sequences: list.
+        :returns: list -- result of scan for every sequence.
+        """
+        sequences = [sequence.upper() for sequence in sequences]
+        offsets = []
+        offset = 0
+        for sequence in sequences:
+            offsets.append(offset)
+            offset += len(sequence) + 1
+        results = [[] for _ in sequences]
+        # motifs never match the separator, so no match spans two sequences
+        for start, index, _ in self.scanner.hits('\n'.join(sequences)):
+            number = bisect_right(offsets, start) - 1
+            results[number].append((start - offsets[number],
+                                    self.scanner.patterns[index][0]))
+        return [sorted(result) for result in results]
+
+
+_immuno_scanner = None
+_immuno_lock = Lock()
+
+
+def immuno_scanner():
+    """Scanner of motifs from immuno database, built again
+    only when the motifs change
+    :returns: ImmunoScanner -- or dict with error.
+    """
+    global _immuno_scanner
+    immuno = get_immuno()
+    if 'error' in immuno:
+        return immuno
+    motifs = [elem['sequence'] for elem in immuno]
+    with _immuno_lock:
+        if _immuno_scanner is None or _immuno_scanner.motifs != motifs:
+            _immuno_scanner = ImmunoScanner(motifs)
+        return _immuno_scanner
+
+
+def find_immuno(sequence, motifs=None):
+    """This function search for immunostimulatory motifs in sequence
+    :param sequence: Sequence in which we search.
+    :type sequence: str.
+    :param motifs: Motif sequences, from immuno database by default.
+    :type motifs: list.
+    :returns: list -- (position, motif) of motifs found in sequence.
+    """
+    scanner = immuno_scanner() if motifs is None else ImmunoScanner(motifs)
+    if isinstance(scanner, dict):
+        return scanner
+    return scanner.scan(sequence)
+
+
+def find_immuno_batch(sequences, motifs=None):
+    """This function search for immunostimulatory motifs in all sequences
+    at once
+    :param sequences: Sequences in which we search.
+    :type sequences: list.
+    :param motifs: Motif sequences, from immuno database by default.
+    :type motifs: list.
+    :returns: list -- (position, motif) of motifs found in every sequence.
+    """
+    scanner = immuno_scanner() if motifs is None else ImmunoScanner(motifs)
+    if isinstance(scanner, dict):
+        return scanner
+    return scanner.scan_batch(sequences)
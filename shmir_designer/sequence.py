@@ -0,0 +1,166 @@
+"""
+.. module:: sequence
+    :synopsis: This module provides 2-bit packed nucleotide sequences.
+
+Nucleotides are coded A=0, C=1, G=2, T/U=3, so the complement of a code
+is 3 - code. Four codes are packed into one byte; positions of letters
+other than ACGTU (like N) are kept aside and get code 4 when unpacked.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+UNKNOWN = 4
+
+# code of every byte (letter), case-insensitive
+CODES = np.full(256, UNKNOWN, dtype=np.uint8)
+for _code, _letters in enumerate(['Aa', 'Cc', 'Gg', 'TtUu']):
+    for _letter in _letters:
+        CODES[ord(_letter)] = _code
+
+DNA = np.frombuffer(b'ACGTN', dtype=np.uint8)
+RNA = np.frombuffer(b'ACGUN', dtype=np.uint8)
+
+SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+
+def encode(sequence):
+    """Translates string into array of codes
+
+    input: string
+    output: numpy array of uint8"""
+    return CODES[np.frombuffer(str(sequence), dtype=np.uint8)]
+
+
+def kmer_codes(codes, k):
+    """Integer codes (base 4 numbers) of all k-mers of array of codes,
+    -1 for k-mers with unknown letters
+
+    input: numpy array of codes, int (at most 31)
+    output: numpy array of int64"""
+    count = max(len(codes) - k + 1, 0)
+    kmers = np.zeros(count, dtype=np.int64)
+    for offset in range(k):
+        kmers <<= 2
+        kmers |= codes[offset:offset + count] & 3
+    unknown = np.concatenate(([0], np.cumsum(codes == UNKNOWN)))
+    kmers[unknown[k:k + count] != unknown[:count]] = -1
+    return kmers
+
+
+class PackedSequence(object):
+    """Nucleotide sequence packed 2 bits per nucleotide"""
+    __slots__ = ('packed', 'length', 'unknown')
+
+    def __init__(self, sequence=''):
+        """Packs string (or PackedSequence)"""
+        if isinstance(sequence, PackedSequence):
+            self.packed = sequence.packed
+            self.length = sequence.length
+            self.unknown = sequence.unknown
+        else:
+            self.pack(encode(sequence))
+
+    @classmethod
+    def from_codes(cls, codes):
+        """Packs array of codes"""
+        sequence = cls.__new__(cls)
+        sequence.pack(np.asarray(codes, dtype=np.uint8))
+        return sequence
+
+    def pack(self, codes):
+        """Stores array of codes packed four codes per byte"""
+        self.length = len(codes)
+        self.unknown = np.flatnonzero(codes == UNKNOWN)
+        padded = np.zeros(-(-self.length // 4) * 4, dtype=np.uint8)
+        padded[:self.length] = codes & 3
+        self.packed = np.bitwise_or.reduce(
+            padded.reshape(-1, 4) << SHIFTS, axis=1).astype(np.uint8)
+
+    def codes(self):
+        """Unpacks sequence into array of codes
+
+        output: numpy array of uint8"""
+        codes = ((self.packed[:, None] >> SHIFTS) & 3).ravel()[:self.length]
+        codes[self.unknown] = UNKNOWN
+        return codes
+
+    def to_str(self, rna=False):
+        """Translates sequence into string, T is written as U when rna is True
+
+        input: bool
+        output: string"""
+        letters = RNA if rna else DNA
+        return letters[self.codes()].tostring()
+
+    def __str__(self):
+        return self.to_str()
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        """Slice of sequence as new PackedSequence"""
+        if not isinstance(key, slice):
+            return self.to_str()[key]
+        return PackedSequence.from_codes(self.codes()[key])
+
+    def __eq__(self, other):
+        return isinstance(other, PackedSequence) and \
+            self.length == other.length and \
+            np.array_equal(self.packed, other.packed) and \
+            np.array_equal(self.unknown, other.unknown)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def nbytes(self):
+        """Memory taken by codes of sequence"""
+        return self.packed.nbytes + self.unknown.nbytes
+
+    def reverse_complement(self):
+        """Reverse complement sequence, unknown letters stay unknown
+
+        output: PackedSequence"""
+        codes = self.codes()[::-1]
+        known = codes != UNKNOWN
+        codes[known] = 3 - codes[known]
+        return PackedSequence.from_codes(codes)
+
+    def windows(self, size, step=1):
+        """All windows of sequence as rows of read-only array
+
+        input: int, int
+        output: 2D numpy array of uint8"""
+        if size < 1 or step < 1:
+            raise ValueError('Size and step of windows must be at least 1')
+        codes = self.codes()
+        count = max((len(codes) - size) // step + 1, 0)
+        return as_strided(codes, shape=(count, size),
+                          strides=(codes.strides[0] * step, codes.strides[0]),
+                          writeable=False)
+
+    def kmers(self, k):
+        """Integer codes (base 4 numbers) of all k-mers, -1 for k-mers
+        with unknown letters
+
+        input: int (at most 31)
+        output: numpy array of int64"""
+        return kmer_codes(self.codes(), k)
+
+    def gc_count(self):
+        """Number of G and C nucleotides"""
+        codes = self.codes()
+        return int(np.count_nonzero((codes == 1) | (codes == 2)))
+
+    def gc_counts(self, size):
+        """Number of G and C nucleotides in every window of given size
+
+        input: int
+        output: numpy array of int64"""
+        if size < 1:
+            raise ValueError('Size of windows must be at least 1')
+        codes = self.codes()
+        gc = np.concatenate(([0], np.cumsum((codes == 1) | (codes == 2))))
+        return gc[size:] - gc[:-size] if size <= len(codes) else gc[:0]
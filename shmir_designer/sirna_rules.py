@@ -0,0 +1,191 @@
+"""
+.. module:: sirna_rules
+    :synopsis: This module provides siRNA efficacy prediction (siRNArules).
+
+Port of siRNArules 1.0 (Holen, RNA, 2006). Every 21 nt antisense strand
+of the mRNA gets PlusValue (similarity to good siRNAs) and NegValue
+(similarity to bad siRNAs) from position specific weights, siRNAs are
+ranked by PlusValue - NegValue (ties keep the order of positions).
+All strands are scored at once with position weight matrices.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from sequence import UNKNOWN, encode
+
+
+SIRNA_LENGTH = 21
+# the last two nucleotides of mRNA never start an antisense strand
+TAIL = 2
+
+BASES = 'ACGU'
+# antisense letter of every sense nucleotide code
+ANTISENSE = np.frombuffer(b'UGCA', dtype='S1')
+
+# weights of antisense letters at positions numbered from 1 (5' end)
+PLUS_RULES = {
+    1: {'A': 66, 'C': -85, 'G': -31, 'U': 78},
+    2: {'A': 20, 'G': -12, 'U': 40},
+    3: {'A': 48, 'C': -8, 'G': -9, 'U': 2},
+    5: {'U': 41},
+    6: {'A': 18, 'U': 18},
+    7: {'A': 26, 'C': -13, 'G': -9, 'U': 38},
+    10: {'A': 54, 'G': -22, 'U': -10},
+    11: {'A': 10, 'U': 29},
+    14: {'A': 22, 'G': -12, 'U': 22},
+    19: {'C': 31, 'G': 1},
+    20: {'A': 16, 'U': 16},
+    21: {'A': 16, 'C': -15, 'G': 28},
+}
+
+NEG_RULES = {
+    1: {'A': -16, 'C': 59, 'G': 80, 'U': -32},
+    2: {'A': -17, 'C': 53, 'G': 13, 'U': -16},
+    4: {'C': 20, 'G': 34, 'U': -11},
+    5: {'A': 15, 'C': 15},
+    6: {'A': 29},
+    7: {'A': -10, 'C': 52, 'G': 12, 'U': -11},
+    10: {'A': -11, 'G': 8, 'U': 24},
+    11: {'A': -8, 'C': 38, 'G': 22, 'U': -13},
+    13: {'A': -10, 'C': 20, 'G': 36},
+    14: {'C': 1, 'G': 27},
+    18: {'A': 37},
+    19: {'A': 80, 'C': -14, 'G': -11, 'U': -6},
+    20: {'C': 28, 'G': 2},
+    21: {'A': 13, 'C': 31, 'G': -9},
+}
+
+SiRNA = namedtuple('SiRNA', ['rank', 'position', 'antisense', 'plus', 'neg'])
+
+
+def weight_matrix(rules):
+    """Translates rules into matrix of weights, one row for every
+    antisense position and one column for every sense nucleotide code
+    (antisense letter is the complement of sense nucleotide)
+
+    input: dictionary of rules
+    output: numpy array of int64"""
+    matrix = np.zeros((SIRNA_LENGTH, len(BASES)), dtype=np.int64)
+    for position, weights in rules.items():
+        for letter, weight in weights.items():
+            matrix[position - 1, 3 - BASES.index(letter)] = weight
+    return matrix
+
+
+PLUS = weight_matrix(PLUS_RULES)
+NEG = weight_matrix(NEG_RULES)
+
+
+def mrna_codes(mrna):
+    """Codes of mRNA nucleotides, letters other than ACGTU are skipped
+    (as in siRNArules, positions are counted without them)
+
+    input: string
+    output: numpy array of uint8"""
+    codes = encode(mrna)
+    return codes[codes != UNKNOWN]
+
+
+def weigh(paired):
+    """PlusValue and NegValue of strands, paired[i] are the sense
+    nucleotides paired with antisense position i + 1 of every strand
+
+    input: sequence of 21 numpy arrays of codes
+    output: numpy arrays of PlusValue and NegValue (int64)"""
+    count = len(paired[0])
+    plus = np.zeros(count, dtype=np.int64)
+    neg = np.zeros(count, dtype=np.int64)
+    for position, codes in enumerate(paired):
+        codes = codes.astype(np.intp)
+        plus += PLUS[position].take(codes)
+        neg += NEG[position].take(codes)
+    return plus, neg
+
+
+def score_codes(codes):
+    """Scores all antisense strands of mRNA codes, one weight lookup
+    per antisense position for all strands at once
+
+    input: numpy array of codes
+    output: numpy arrays of PlusValue and NegValue (int64),
+    index i is the strand of mRNA position i + 1"""
+    count = max(len(codes) - SIRNA_LENGTH - TAIL + 1, 0)
+    return weigh([codes[SIRNA_LENGTH - 1 - position:][:count]
+                  for position in range(SIRNA_LENGTH)])
+
+
+def score_targets(targets):
+    """Scores antisense strands of target sequences (21 nt parts of mRNA,
+    only ACGTU letters)
+
+    input: list of strings
+    output: numpy arrays of PlusValue and NegValue (int64)"""
+    codes = encode(''.join(targets)).reshape(len(targets), SIRNA_LENGTH)
+    return weigh(codes.T[::-1])
+
+
+def score_windows(mrna):
+    """Scores all antisense strands of mRNA
+
+    input: string
+    output: numpy arrays of PlusValue and NegValue (int64)"""
+    return score_codes(mrna_codes(mrna))
+
+
+def scores(mrna):
+    """Score (PlusValue - NegValue) of all antisense strands of mRNA
+
+    input: string
+    output: numpy array of int64"""
+    plus, neg = score_windows(mrna)
+    return plus - neg
+
+
+def ranking(score, k=None):
+    """Indices of the k best scores, best first, ties in order of indices
+    (the order of stable sort), all indices when k is None
+
+    input: numpy array, int
+    output: numpy array of indices"""
+    # unique keys, so partial selection gives exactly the sorted prefix
+    keys = -score * len(score) + np.arange(len(score))
+    if k is None or k >= len(keys):
+        return np.argsort(keys)
+    if k <= 0:
+        return keys[:0]
+    best = np.argpartition(keys, k - 1)[:k]
+    return best[np.argsort(keys[best])]
+
+
+def antisense(codes, position):
+    """Antisense strand of mRNA position (numbered from 1)"""
+    window = codes[position - 1:position - 1 + SIRNA_LENGTH][::-1]
+    return ANTISENSE[window].tostring()
+
+
+def rank(mrna, k=None):
+    """Ranks antisense strands of mRNA like siRNArules
+
+    input: string, number of best siRNAs (all when None)
+    output: list of SiRNA (rank, position, antisense, plus, neg)"""
+    codes = mrna_codes(mrna)
+    plus, neg = score_codes(codes)
+    return [SiRNA(number, int(index) + 1, antisense(codes, index + 1),
+                  int(plus[index]), int(neg[index]))
+            for number, index in enumerate(ranking(plus - neg, k), 1)]
+
+
+def write_output(sirnas, stream):
+    """Writes siRNAs in the format of siRNArules output.dat"""
+    for sirna in sirnas:
+        stream.write('%d\t%d\t%s\t%d\t%d\r\n' % sirna)
+
+
+if __name__ == '__main__':
+    import sys
+    with open(sys.argv[1] if len(sys.argv) > 1 else 'mRNA_input.dat') as f:
+        ranked = rank(f.read())
+    with open(sys.argv[2] if len(sys.argv) > 2 else 'output.dat', 'w') as f:
+        write_output(ranked, f)
@@ -8,11 +8,19 @@ def parse_ss(file_name):
         and last column on output
         input: string
         output: list of tuples with two elements"""
-    read_data = []
     with open(file_name, "r") as ss_file:
-        for line in ss_file.readlines():
-            splited = line.split()
-            read_data.append(map(int, [splited[0], splited[-1]]))
+        return parse_ss_lines(ss_file)
+
+
+def parse_ss_lines(lines):
+    """Function which parses lines of ss file and returns tuples with first
+        and last column on output
+        input: iterable of strings
+        output: list of tuples with two elements"""
+    read_data = []
+    for line in lines:
+        splited = line.split()
+        read_data.append(map(int, [splited[0], splited[-1]]))
     return read_data
 
 
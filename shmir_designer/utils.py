@@ -4,8 +4,15 @@
 """
 
 from string import maketrans
+from threading import Lock
 from backbone import Backbone
 
+# shifts of siRNA ends with precompiled recipes,
+# check_complementary returns ends from this range
+SHIFTS = range(-6, 7)
+
+COMPLEMENT = maketrans("atcgATCG", "tagcTAGC")
+
 
 def reverse_complement(sequence):
     """Generates reverse complement sequence to given
@@ -13,7 +20,180 @@ def reverse_complement(sequence):
     input: string
     output: string"""
     sequence = str(sequence)
-    return sequence.translate(maketrans("atcgATCG", "tagcTAGC"))[::-1]
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def compile_recipe(frame, shift_left, shift_right):
+    """Compiles edits which reconcile ends of siRNA (shift_left, shift_right)
+    with ends of miRNA in frame (see get_frames). Recipe is a tuple of:
+    slice kept from flanks5_s, addition to flanks5_s, slice kept
+    from flanks3_s, slice kept from loop_s, addition to loop_s, addition
+    to the first strand and addition to the second strand.
+    Addition is either a string (reverse complement of a part of backbone,
+    computed here) or a slice of strand which is reverse complemented:
+    of the second strand for flanks5_s and the first strand,
+    of the first strand for loop_s and the second strand.
+
+    input: Backbone object, int, int
+    output: tuple"""
+    end_5, end_3 = frame.miRNA_end_5, frame.miRNA_end_3
+    flanks5_cut = flanks3_cut = loop_cut = slice(None)
+    flanks5_add = loop_add = seq1_add = seq2_add = ''
+    if shift_left == end_5 and shift_right == end_5:
+        return (flanks5_cut, flanks5_add, flanks3_cut, loop_cut, loop_add,
+                seq1_add, seq2_add)
+
+    #miRNA 5 end (left)
+    if end_5 < shift_left:
+        if end_5 < 0 and shift_left < 0:
+            seq2_add = reverse_complement(frame.flanks5_s[end_5:shift_left])
+        elif end_5 < 0 and shift_left > 0:
+            flanks5_cut = slice(None, end_5)
+            seq2_add = slice(None, shift_left)
+        elif shift_left == 0:
+            seq2_add = reverse_complement(frame.flanks5_s[:end_5])
+        elif end_5 == 0:
+            seq2_add = slice(None, end_5)
+        else:
+            seq2_add = slice(end_5, shift_left)
+    elif end_5 > shift_left:
+        if end_5 > 0 and shift_left < 0:
+            flanks5_add = slice(end_5, None)
+            flanks3_cut = slice(end_5, None)
+        elif end_5 > 0 and shift_left > 0:
+            flanks5_add = reverse_complement(
+                frame.flanks3_s[shift_left:end_5])
+        elif shift_left == 0:
+            flanks5_add = reverse_complement(frame.flanks3_s[:end_5])
+        elif end_5 == 0:
+            flanks5_add = slice(shift_left, None)
+        else:
+            flanks5_add = slice(shift_left, end_5)
+
+    #miRNA 3 end (right)
+    if end_3 < shift_right:
+        if end_3 < 0 and shift_right > 0:
+            loop_cut = slice(-end_3, None)
+            loop_add = slice(-shift_right, None)
+        elif end_3 > 0 and shift_right > 0:
+            loop_add = slice(-shift_right, -end_3)
+        elif end_3 == 0:
+            loop_add = slice(-shift_right, None)
+        elif shift_right == 0:
+            loop_add = reverse_complement(frame.loop_s[:-end_3])
+        else:
+            loop_add = reverse_complement(frame.loop_s[-shift_right:-end_3])
+    elif end_3 > shift_right:
+        if end_3 > 0 and shift_right < 0:
+            seq1_add = slice(None, -shift_right)
+            loop_cut = slice(None, -end_3)
+        elif end_3 > 0 and shift_right > 0:
+            seq1_add = reverse_complement(frame.loop_s[-end_3:-shift_right])
+        elif shift_right == 0:
+            seq1_add = reverse_complement(frame.loop_s[:end_3])
+        elif end_3 == 0:
+            seq1_add = slice(None, -shift_right)
+        else:
+            seq1_add = slice(-end_3, -shift_right)
+    return (flanks5_cut, flanks5_add, flanks3_cut, loop_cut, loop_add,
+            seq1_add, seq2_add)
+
+
+class FrameTables(object):
+    """Backbones of the catalog with recipes of their frames for every pair
+    of siRNA ends from SHIFTS, built once per catalog"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.catalog = None
+        self.backbones = []
+        self.recipes = {}
+
+    def load(self, all_frames):
+        """Builds backbones and their recipes, unless the catalog
+        is the same as the one loaded before
+
+        input: list of pri-miRNA dictionaries
+        output: list of Backbone objects"""
+        with self.lock:
+            if all_frames == self.catalog:
+                return self.backbones
+        catalog = [dict(elem) for elem in all_frames]
+        backbones = [Backbone(**elem) for elem in all_frames]
+        recipes = dict(((left, right),
+                        [prepare_recipe(frame,
+                                        compile_recipe(frame, left, right))
+                         for frame in backbones])
+                       for left in SHIFTS for right in SHIFTS)
+        with self.lock:
+            self.catalog = catalog
+            self.backbones = backbones
+            self.recipes = recipes
+        return backbones
+
+    def frames(self, seq1, seq2, shift_left, shift_right, all_frames):
+        """Builds frames of all backbones from recipes
+
+        input: string, string, int, int, pri-miRNA dictionaries
+        output: list of lists of Backbone object, 1st strand 2nd strand"""
+        self.load(all_frames)
+        with self.lock:
+            backbones = self.backbones
+            recipes = self.recipes.get((shift_left, shift_right))
+        if recipes is None:
+            recipes = [prepare_recipe(frame, compile_recipe(
+                frame, shift_left, shift_right)) for frame in backbones]
+        return [apply_recipe(recipe, seq1, seq2) for recipe in recipes]
+
+
+def prepare_recipe(frame, recipe):
+    """Applies parts of recipe which do not depend on strands to copy
+    of frame, returns tuple of that frame, additions to flanks5_s and loop_s
+    (slices of strands or empty strings) and additions to both strands
+
+    input: Backbone object, tuple (see compile_recipe)
+    output: tuple"""
+    (flanks5_cut, flanks5_add, flanks3_cut, loop_cut, loop_add,
+     seq1_add, seq2_add) = recipe
+    flanks5_s = frame.flanks5_s[flanks5_cut]
+    loop_s = frame.loop_s[loop_cut]
+    if not isinstance(flanks5_add, slice):
+        flanks5_s, flanks5_add = flanks5_s + flanks5_add, ''
+    if not isinstance(loop_add, slice):
+        loop_s, loop_add = loop_s + loop_add, ''
+    frame = frame.copy(flanks5_s=flanks5_s, loop_s=loop_s,
+                       flanks3_s=frame.flanks3_s[flanks3_cut])
+    return frame, flanks5_add, loop_add, seq1_add, seq2_add
+
+
+def extension(addition, strand):
+    """Returns addition of recipe, reverse complementing slice of strand
+
+    input: string or slice, string
+    output: string"""
+    if isinstance(addition, slice):
+        return reverse_complement(strand[addition])
+    return addition
+
+
+def apply_recipe(recipe, seq1, seq2):
+    """Builds frame from prepared recipe, the second strand is extended
+    first as the first strand may be extended by its part.
+    Backbone object is copied only when it depends on strands.
+
+    input: tuple (see prepare_recipe), string, string
+    output: list of Backbone object, 1st strand 2nd strand"""
+    frame, flanks5_add, loop_add, seq1_add, seq2_add = recipe
+    seq2 += extension(seq2_add, seq1)
+    if flanks5_add or loop_add:
+        frame = frame.copy(
+            flanks5_s=frame.flanks5_s + extension(flanks5_add, seq2),
+            loop_s=frame.loop_s + extension(loop_add, seq1))
+    seq1 += extension(seq1_add, seq2)
+    return [frame, seq1, seq2]
+
+
+frame_tables = FrameTables()
 
 
 def get_frames(seq1, seq2, shift_left, shift_right, all_frames):
@@ -50,82 +230,11 @@ def get_frames(seq1, seq2, shift_left, shift_right, all_frames):
     Nucleotides are always added to the right side of sequences.
     We cut off nucleotides only from flanking sequences or loop.
 
+    Edits are looked up in recipes compiled once per catalog
+    (see compile_recipe and FrameTables). Backbone objects of frames
+    may be shared between calls, so they must not be modified.
+
     input: string, string, int, int, pri-miRNA objects
     output: List of list of Backbone object, 1st strand 2nd strand   """
-    frames = []
-    for elem in all_frames:
-        frame = Backbone(**elem)
-        if shift_left == frame.miRNA_end_5 and shift_right == frame.miRNA_end_5:
-            frames.append([frame, seq1, seq2])
-        else:
-            _seq1 = seq1[:]
-            _seq2 = seq2[:]
-            #miRNA 5 end (left)
-            if frame.miRNA_end_5 < shift_left:
-                if frame.miRNA_end_5 < 0 and shift_left < 0:
-                    _seq2 += reverse_complement(
-                        frame.flanks5_s[frame.miRNA_end_5:shift_left])
-                elif frame.miRNA_end_5 < 0 and shift_left > 0:
-                    frame.flanks5_s = frame.flanks5_s[:frame.miRNA_end_5]
-                    _seq2 += reverse_complement(_seq1[:shift_left])
-                elif shift_left == 0:
-                    _seq2 += reverse_complement(
-                        frame.flanks5_s[:frame.miRNA_end_5])
-                elif frame.miRNA_end_5 == 0:
-                    _seq2 += reverse_complement(_seq1[:frame.miRNA_end_5])
-                else:
-                    _seq2 += reverse_complement(
-                        _seq1[frame.miRNA_end_5:shift_left])
-            elif frame.miRNA_end_5 > shift_left:
-                if frame.miRNA_end_5 > 0 and shift_left < 0:
-                    frame.flanks5_s += reverse_complement(
-                        _seq2[frame.miRNA_end_5:])
-                    frame.flanks3_s = frame.flanks3_s[frame.miRNA_end_5:]
-                elif frame.miRNA_end_5 > 0 and shift_left > 0:
-                    frame.flanks5_s += reverse_complement(
-                        frame.flanks3_s[shift_left:frame.miRNA_end_5])
-                elif shift_left == 0:
-                    frame.flanks5_s += reverse_complement(
-                        frame.flanks3_s[:frame.miRNA_end_5])
-                elif frame.miRNA_end_5 == 0:
-                    frame.flanks5_s += reverse_complement(_seq2[shift_left:])
-                else:
-                    frame.flanks5_s += reverse_complement(
-                        _seq2[shift_left:frame.miRNA_end_5])
-
-            #miRNA 3 end (right)
-            if frame.miRNA_end_3 < shift_right:
-                if frame.miRNA_end_3 < 0 and shift_right > 0:
-                    frame.loop_s = frame.loop_s[-frame.miRNA_end_3:]
-                    frame.loop_s += reverse_complement(
-                        _seq1[-shift_right:])
-                elif frame.miRNA_end_3 > 0 and shift_right > 0:
-                    frame.loop_s += reverse_complement(
-                        _seq1[-shift_right:-frame.miRNA_end_3])
-                elif frame.miRNA_end_3 == 0:
-                    frame.loop_s += reverse_complement(_seq1[-shift_right:])
-                elif shift_right == 0:
-                    frame.loop_s += reverse_complement(
-                        frame.loop_s[:-frame.miRNA_end_3])
-                else:
-                    frame.loop_s += reverse_complement(
-                        frame.loop_s[-shift_right:-frame.miRNA_end_3])
-            elif frame.miRNA_end_3 > shift_right:
-                if frame.miRNA_end_3 > 0 and shift_right < 0:
-                    _seq1 += reverse_complement(
-                        _seq2[:-shift_right])
-                    frame.loop_s = frame.loop_s[:-frame.miRNA_end_3]
-                elif frame.miRNA_end_3 > 0 and shift_right > 0:
-                    _seq1 += reverse_complement(
-                        frame.loop_s[-frame.miRNA_end_3:-shift_right])
-                elif shift_right == 0:
-                    _seq1 += reverse_complement(
-                        frame.loop_s[:frame.miRNA_end_3])
-                elif frame.miRNA_end_3 == 0:
-                    _seq1 += reverse_complement(_seq2[:-shift_right])
-                else:
-                    _seq1 += reverse_complement(
-                        _seq2[-frame.miRNA_end_3:-shift_right])
-
-            frames.append([frame, _seq1, _seq2])
-    return frames
+    return frame_tables.frames(seq1, seq2, shift_left, shift_right,
+                               all_frames)
@@ -9,12 +9,17 @@ import errors
 import logging
 
 
+# correct siRNA strand (lowercase, after changing 'u' to 't')
+SIRNA_PATTERN = re.compile(r'^[acgt]{19,21}$')
+
+
 def check_complementary_single(seq1, seq2):
-    """The function checks complementary of two sequences
+    """The function checks complementary of two sequences,
+    U and T are the same nucleotide in both of them
 
     input: string, string
     output: int"""
-    seq1, seq2 = seq1.lower(), seq2.lower()
+    seq1, seq2 = seq1.lower(), seq2.lower().replace('u', 't')
     tran = {"a": "t",
             "t": "a",
             "u": "a",
@@ -81,18 +86,17 @@ def check_input_single(seq):
     Input: string;
     The function has no output"""
     seq = seq.lower().replace('u', 't')
-    pattern = re.compile(r'^[acgt]{19,21}$')
     cut_warn = "cut 'uu' or 'tt'"
 
-    if not pattern.search(seq):
+    if not SIRNA_PATTERN.search(seq):
         if len(seq) > 21 or len(seq) < 19:
             raise errors.InputException('%s' % errors.len_error)
         raise errors.InputException('%s' % errors.patt_error)
-    elif seq[-2:] == "tt" and pattern.search(seq):
+    elif seq[-2:] == "tt" and SIRNA_PATTERN.search(seq):
         seq = seq[:-2]
         logging.warn(cut_warn)
         return [seq, cut_warn, True]
-    elif pattern.search(seq):
+    elif SIRNA_PATTERN.search(seq):
         return [seq, None, True]
 
 
@@ -0,0 +1,216 @@
+"""
+Former implementations of sh-miR designer functions, replaced by faster
+ones and kept as reference for equivalence tests
+"""
+
+import os
+import re
+from itertools import chain
+from math import ceil
+
+from shmir_designer.backbone import Backbone
+from shmir_designer.ss import parse_score
+from shmir_designer.utils import reverse_complement
+
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), '..', 'shmir_api',
+                        'shmirdesignercreate.sql')
+DESIGNER_PATH = os.path.join(os.path.dirname(__file__), '..',
+                             'shmir_designer')
+
+BACKBONE_COLUMNS = [
+    'name', 'flanks3_s', 'flanks3_a', 'flanks5_s', 'flanks5_a', 'loop_s',
+    'loop_a', 'miRNA_s', 'miRNA_a', 'miRNA_length', 'miRNA_min', 'miRNA_max',
+    'miRNA_end_5', 'miRNA_end_3', 'structure', 'homogeneity', 'miRBase_link',
+    'active_strand']
+
+
+def backbone_rows():
+    """Backbones inserted by shmirdesignercreate.sql as dictionaries
+    of columns (structures are relative to shmir_designer directory)"""
+    with open(SQL_PATH) as sql_file:
+        sql = sql_file.read()
+    sql = sql[sql.index('INSERT INTO backbone'):]
+    rows = []
+    for values in re.finditer(r'\(DEFAULT,(.*?)\)\s*[,;]', sql, re.S):
+        row = [value.strip() for value in values.group(1).split(',')]
+        rows.append(dict(zip(BACKBONE_COLUMNS,
+                             [value.strip("'") if value.startswith("'")
+                              else int(value) for value in row])))
+    return rows
+
+
+def score_frame(frame, frame_ss, orginal_frame):
+    """Frame is a tuple of object Backbone and two sequences
+    frame_ss is list of pairs parsed from mfold ss file
+    orignal_frame is object Backbone from database (not changed)
+
+    input: sh-miR object, list of pairs, ss_file
+    output: int"""
+
+    structure, seq1, seq2 = frame
+    structure_ss = [list(pair) for pair in frame_ss]
+    max_score, orginal_score = parse_score(u'.' + orginal_frame.structure)
+
+    #differences
+    flanks5 = len(orginal_frame.flanks5_s) - len(structure.flanks5_s)
+    insertion1 = len(orginal_frame.miRNA_s) - len(seq1)
+    loop = len(orginal_frame.loop_s) - len(structure.loop_s)
+    insertion2 = len(orginal_frame.miRNA_a) - len(seq2)
+    flanks3 = len(orginal_frame.flanks3_s) - len(structure.flanks3_s)
+
+    position = len(structure.flanks5_s)  # position in sequence (list)
+    structure_len = len(structure.template(seq1, seq2))
+    current = position + flanks5  # current position (after changes)
+
+    if flanks5 < 0:
+        add_shifts(0, structure_len, structure_ss, flanks5, 0)
+    else:
+        add_shifts(position, structure_len,
+                   structure_ss, flanks5, current)
+    for diff, nucleotides in [(insertion1, seq1), (loop, structure.loop_s),
+                              (insertion2, seq2), (flanks3, '')]:
+        position += len(nucleotides)
+        current = position + diff
+        add_shifts(position, structure_len, structure_ss, diff, current)
+    score = 0
+    for shmir in structure_ss:
+        for template in orginal_score:
+            if shmir == template[0]:
+                score += template[1]
+    return int(ceil(score/max_score * 100))
+
+
+def add_shifts(start, end, frame_ss, value, current):
+    """The numbers assigned to the nucleotides have to be verified,
+    because flanking sequences can be shortened or extended during insertion.
+    Moreover, the length of the siRNA insert can differ from the natural one.
+
+    input: start, end, frame_ss, value, current.
+    The function has no output"""
+    for num in range(end):
+        if num >= start:
+            frame_ss[num][0] += value
+        if frame_ss[num][1] != 0 and frame_ss[num][1] > current:
+            frame_ss[num][1] += value
+
+
+def get_frames(seq1, seq2, shift_left, shift_right, all_frames):
+    """Take output of check_input function and insert into flanking sequences
+    (every frame built separately by the if/elif tree of both ends)
+
+    input: string, string, int, int, pri-miRNA objects
+    output: List of list of Backbone object, 1st strand 2nd strand   """
+    frames = []
+    for elem in all_frames:
+        frame = Backbone(**elem)
+        if shift_left == frame.miRNA_end_5 and shift_right == frame.miRNA_end_5:
+            frames.append([frame, seq1, seq2])
+        else:
+            _seq1 = seq1[:]
+            _seq2 = seq2[:]
+            #miRNA 5 end (left)
+            if frame.miRNA_end_5 < shift_left:
+                if frame.miRNA_end_5 < 0 and shift_left < 0:
+                    _seq2 += reverse_complement(
+                        frame.flanks5_s[frame.miRNA_end_5:shift_left])
+                elif frame.miRNA_end_5 < 0 and shift_left > 0:
+                    frame.flanks5_s = frame.flanks5_s[:frame.miRNA_end_5]
+                    _seq2 += reverse_complement(_seq1[:shift_left])
+                elif shift_left == 0:
+                    _seq2 += reverse_complement(
+                        frame.flanks5_s[:frame.miRNA_end_5])
+                elif frame.miRNA_end_5 == 0:
+                    _seq2 += reverse_complement(_seq1[:frame.miRNA_end_5])
+                else:
+                    _seq2 += reverse_complement(
+                        _seq1[frame.miRNA_end_5:shift_left])
+            elif frame.miRNA_end_5 > shift_left:
+                if frame.miRNA_end_5 > 0 and shift_left < 0:
+                    frame.flanks5_s += reverse_complement(
+                        _seq2[frame.miRNA_end_5:])
+                    frame.flanks3_s = frame.flanks3_s[frame.miRNA_end_5:]
+                elif frame.miRNA_end_5 > 0 and shift_left > 0:
+                    frame.flanks5_s += reverse_complement(
+                        frame.flanks3_s[shift_left:frame.miRNA_end_5])
+                elif shift_left == 0:
+                    frame.flanks5_s += reverse_complement(
+                        frame.flanks3_s[:frame.miRNA_end_5])
+                elif frame.miRNA_end_5 == 0:
+                    frame.flanks5_s += reverse_complement(_seq2[shift_left:])
+                else:
+                    frame.flanks5_s += reverse_complement(
+                        _seq2[shift_left:frame.miRNA_end_5])
+
+            #miRNA 3 end (right)
+            if frame.miRNA_end_3 < shift_right:
+                if frame.miRNA_end_3 < 0 and shift_right > 0:
+                    frame.loop_s = frame.loop_s[-frame.miRNA_end_3:]
+                    frame.loop_s += reverse_complement(
+                        _seq1[-shift_right:])
+                elif frame.miRNA_end_3 > 0 and shift_right > 0:
+                    frame.loop_s += reverse_complement(
+                        _seq1[-shift_right:-frame.miRNA_end_3])
+                elif frame.miRNA_end_3 == 0:
+                    frame.loop_s += reverse_complement(_seq1[-shift_right:])
+                elif shift_right == 0:
+                    frame.loop_s += reverse_complement(
+                        frame.loop_s[:-frame.miRNA_end_3])
+                else:
+                    frame.loop_s += reverse_complement(
+                        frame.loop_s[-shift_right:-frame.miRNA_end_3])
+            elif frame.miRNA_end_3 > shift_right:
+                if frame.miRNA_end_3 > 0 and shift_right < 0:
+                    _seq1 += reverse_complement(
+                        _seq2[:-shift_right])
+                    frame.loop_s = frame.loop_s[:-frame.miRNA_end_3]
+                elif frame.miRNA_end_3 > 0 and shift_right > 0:
+                    _seq1 += reverse_complement(
+                        frame.loop_s[-frame.miRNA_end_3:-shift_right])
+                elif shift_right == 0:
+                    _seq1 += reverse_complement(
+                        frame.loop_s[:frame.miRNA_end_3])
+                elif frame.miRNA_end_3 == 0:
+                    _seq1 += reverse_complement(_seq2[:-shift_right])
+                else:
+                    _seq1 += reverse_complement(
+                        _seq2[-frame.miRNA_end_3:-shift_right])
+
+            frames.append([frame, _seq1, _seq2])
+    return frames
+
+
+def findall_overlapping(pattern, string):
+    """
+    :param pattern: Pattern string.
+    :type pattern: str.
+    :param string: String in which we search.param
+    :type string: str.
+    :returns: list -- all unique overlapping matches of pattern in string.
+    """
+    regex = re.compile(pattern)
+    results = []
+    pos = 0
+
+    while True:
+        result = regex.search(string, pos)
+        if not result:
+            break
+        results.append(result.group())
+        pos = result.start() + 1
+    return list(set(results))
+
+
+def find_by_patterns(patterns, mRNA):
+    """This function search for patterns in mRNA (every pattern
+    with its own regular expression)
+    :param patterns: Dict of patterns.
+    :type patterns: dict.
+    :param mRNA: mRNA sequnece.
+    :type mRNA: str.
+    :returns: dict -- all sequences found by patterns.
+    """
+    return {
+        key: list(chain(*(findall_overlapping(pattern, mRNA) for pattern in patt_list)))
+        for key, patt_list in patterns.items()
+    }
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+
+"""
+Test for shmiR API
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../shmir_api/src/")))
+import unittest
+import shutil
+import tempfile
+from shmir_api.mfold.cache import FoldCache
+from shmir_api.database.cache import BackboneIndex
+
+
+class TestShmiRAPI(unittest.TestCase):
+    """Tests for shmiR API"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fold_files(self, name, size):
+        """Creates mfold output file of the given size"""
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as f:
+            f.write('x' * size)
+        return [filename]
+
+    def test_fold_cache(self):
+        """Tests for hit counting and LRU eviction of mfold results cache"""
+        cache = FoldCache(os.path.join(self.directory, 'cache'), 250)
+        self.assertIsNone(cache.get('a'))
+        for key in 'abc':
+            cache.release(cache.put(key, self.fold_files(key + '.ss', 100)))
+        # the least recently used entry is evicted
+        self.assertIsNone(cache.get('a'))
+        files = cache.get('d', 'b')
+        self.assertEqual([os.path.basename(name) for name in files], ['b.ss'])
+        cache.release(files)
+        cache.release(cache.put('d', self.fold_files('d.ss', 100)))
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 3, 'entries': 2,
+                                         'size': 200, 'max_size': 250})
+
+        # entries in use are evicted only after they are released
+        files = cache.get('b')
+        cache.release(cache.get('d'))
+        cache.release(cache.put('e', self.fold_files('e.ss', 100)))
+        self.assertTrue(os.path.exists(files[0]))
+        self.assertIsNone(cache.get('d'))
+        cache.release(files)
+        cache.release(cache.put('f', self.fold_files('f.ss', 100)))
+        self.assertIsNone(cache.get('b'))
+        self.assertFalse(os.path.exists(files[0]))
+
+        # the index is read again from disk
+        cache = FoldCache(cache.path, 250)
+        self.assertEqual(cache.stats()['entries'], 2)
+        self.assertIsNotNone(cache.get('e'))
+
+    def test_backbone_index(self):
+        """Tests for lookups of backbones by name and by miRNA_s"""
+        rows = [{'name': 'miR-30a', 'miRNA_s': 'UGUAAACAUCCUCGACUGGAAG'},
+                {'name': 'miR-155', 'miRNA_s': 'UUAAUGCUAAUCGUGAUAGGGGU'},
+                {'name': 'MIR-155', 'miRNA_s': 'CUCCUACAUAUUAGCAUUAACA'},
+                {'name': 'miR-21', 'miRNA_s': 'UAGCUUAUCAGACUGAUGUUGA'},
+                {'name': 'miR-31', 'miRNA_s': 'UUUGCAUCGUGAUAGGGGU'}]
+        index = BackboneIndex(rows)
+        self.assertEqual(index.get_by_name('MiR-30A'), rows[0])
+        # the first of names equal regardless of case
+        self.assertEqual(index.get_by_name('mir-155'), rows[1])
+        self.assertEqual(index.get_by_name('miR-1'), {})
+        self.assertEqual(index.get_by_miRNA_s('uu'), [rows[1], rows[4]])
+        self.assertEqual(index.get_by_miRNA_s('UA'), [rows[3]])
+        self.assertEqual(index.get_by_miRNA_s('GG'), [])
+
+if __name__ == '__main__':
+    unittest.main()
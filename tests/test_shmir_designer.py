@@ -9,9 +9,23 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../shmir_api/src/")))
 import unittest
+import shutil
+import tempfile
+import random
+import re
+from cStringIO import StringIO
 from shmir_designer import validators
 from shmir_designer import errors
 from shmir_designer import search
+from shmir_designer import mfe
+from shmir_designer import sequence
+from shmir_designer import sirna_rules
+from shmir_designer import pipeline
+from shmir_designer import offtarget
+from shmir_designer import score
+from shmir_designer import utils
+from shmir_designer.backbone import Backbone
+from tests import reference
 from shmir_api.database import database
 
 
@@ -93,6 +107,12 @@ class TestShmiR(unittest.TestCase):
         for seq1, seq2, expected in tests:
             self.failUnlessEqual(validators.check_complementary(seq1, seq2), expected)
 
+        # U pairs like T in both strands
+        self.assertEqual(validators.check_complementary_single('ACGU', 'ACGU'), 100)
+        self.assertEqual(validators.check_complementary_single('aaaa', 'uuuu'), 100)
+        self.assertEqual(validators.check_complementary_single('acgt', 'acgg'), 75)
+        self.assertRaises(KeyError, validators.check_complementary_single, 'acgn', 'acgt')
+
 
 
     def test_create_regular(self):
@@ -156,18 +176,303 @@ class TestShmiR(unittest.TestCase):
             self.failUnlessEqual(actual, expected)   
             
     def test_find_immuno(self):
-        """Tests for finding immunostimulatory sequences"""
+        """Tests for finding immunostimulatory sequences (U and T match
+        each other, so GT counts as GU)"""
+        motifs = ['UGUGU', 'GUCCUUCAA', 'GU', 'AU', 'UGGC', 'UUUUU']
         tests=[
-        ('UGUGUCTCGCCGCGAGG', ['UGUGU', 'GU']),
-        ('UUUUUGUGUCTCGCCGCGAGG', ['UGUGU', 'GU', 'UUUUU']),
-        ('GTTGCCGGGACGGGCCCGUCCUUCAAAUGGCGTTGCCGGGACGGGCCC', ['GUCCUUCAA', 'GU', 'AU', 'UGGC']),
-        ('GTTGCCGGGACGGGCCC', []),
+        ('UGUGUCTCGCCGCGAGG', [(0, 'UGUGU'), (1, 'GU'), (3, 'GU')]),
+        ('UUUUUGUGUCTCGCCGCGAGG', [(0, 'UUUUU'), (4, 'UGUGU'), (5, 'GU'),
+                                   (7, 'GU')]),
+        ('GTTGCCGGGACGGGCCCGUCCUUCAAAUGGCGTTGCCGGGACGGGCCC',
+         [(0, 'GU'), (17, 'GU'), (17, 'GUCCUUCAA'), (26, 'AU'), (27, 'UGGC'),
+          (31, 'GU')]),
+        ('GTTGCCGGGACGGGCCC', [(0, 'GU')]),
+        ('ugugu', [(0, 'UGUGU'), (1, 'GU'), (3, 'GU')]),
         ('', [])
         ]
-        for test in tests:
-            test[1].sort()
         for sequence, expected in tests:
-            self.failUnlessEqual(search.find_immuno(sequence).sort(), expected)
+            self.failUnlessEqual(search.find_immuno(sequence, motifs=motifs),
+                                 expected)
+        self.failUnlessEqual(
+            search.find_immuno_batch([sequence for sequence, _ in tests],
+                                     motifs=motifs),
+            [expected for _, expected in tests])
             
+    def test_mfe_fold(self):
+        """Tests for in-process minimum free energy folding"""
+        self.assertEqual(
+            mfe.fold_pairs('GGGGAAAACCCC'),
+            [[1, 12], [2, 11], [3, 10], [4, 9], [5, 0], [6, 0], [7, 0],
+             [8, 0], [9, 4], [10, 3], [11, 2], [12, 1]])
+        self.assertEqual(mfe.fold('AAAAAAAAAA'), (0.0, [-1] * 10))
+        energy, pairs = mfe.fold('GGGGAAAACCCC')
+        self.assertTrue(energy < 0)
+
+    def test_packed_sequence(self):
+        """Tests for 2-bit packed sequences"""
+        packed = sequence.PackedSequence('acgUNt')
+        self.assertEqual(str(packed), 'ACGTNT')
+        self.assertEqual(packed.to_str(rna=True), 'ACGUNU')
+        self.assertEqual(str(packed.reverse_complement()), 'ANACGT')
+        self.assertEqual(str(packed[1:4]), 'CGT')
+        self.assertEqual(packed.gc_count(), 2)
+        self.assertEqual(list(packed.gc_counts(3)), [2, 2, 1, 0])
+        self.assertEqual(list(packed.gc_counts(7)), [])
+        self.assertRaises(ValueError, packed.gc_counts, 0)
+        self.assertRaises(ValueError, packed.gc_counts, -1)
+        self.assertRaises(ValueError, packed.windows, 2, 0)
+        self.assertEqual(list(packed.kmers(2)), [1, 6, 11, -1, -1])
+
+    def test_sirna_rules(self):
+        """Tests for siRNArules ranking of antisense strands"""
+        mrna = 'GCAUGCUAGCUAGCUAGGACUUACGAUCGG'
+        self.assertEqual(list(sirna_rules.scores(mrna)),
+                         [-15, 133, 101, -39, -275, 76, 159, -141])
+        self.assertEqual(sirna_rules.rank(mrna, 2), [
+            (1, 7, 'AUCGUAAGUCCUAGCUAGCUA', 234, 75),
+            (2, 2, 'AAGUCCUAGCUAGCUAGCAUG', 188, 55)])
+        self.assertEqual([sirna.position for sirna in
+                          sirna_rules.rank('a' * 25)], [1, 2, 3])
+
+    def test_pipeline_stages(self):
+        """Tests for cheap stages of transcript pipeline"""
+        mrna = '>tx desc\nGCAUGCUAGCUAGCUAGGAC\nUUACGAUCGGNACGUACGUACGUACGUACGUA\n'
+        candidates = list(pipeline.windows(mrna, chunk_size=7))
+        self.assertEqual(len(candidates), 32)
+        self.assertEqual(candidates[1][:3], ('tx', 2, 'CAUGCUAGCUAGCUAGGACUU'))
+        scored = list(pipeline.score(pipeline.validate(candidates)))
+        self.assertEqual([candidate.position for candidate in scored],
+                         range(1, 11) + [32])
+        self.assertEqual(scored[1].sirna, 'aagtcctagctagctagcatg')
+        self.assertEqual(scored[1].score, 133)
+        best = list(pipeline.top(pipeline.filter_immuno(scored, ['UUUUU']), 2))
+        self.assertEqual([candidate.position for candidate in best], [7, 2])
+
+    def test_seed_index(self):
+        """Tests for local seed match index"""
+        directory = tempfile.mkdtemp()
+        try:
+            fasta = os.path.join(directory, 'transcripts.fa')
+            with open(fasta, 'w') as f:
+                f.write('>tx1 first\nGGUCAAGCAUUCCAAGCA\nUUUCAAGNCAU\n'
+                        '>tx2\nUCAAGCAUAAAA\n>tx3\nUCAAG\n')
+            index = offtarget.SeedIndex.build(
+                fasta, os.path.join(directory, 'index'), chunk_size=5)
+            # seed UGCUUGA pairs with site UCAAGCA
+            guide = 'AUGCUUGAAAGGCUUGCCAUU'
+            self.assertEqual(index.count(guide), 2)
+            hits = offtarget.SeedIndex(
+                os.path.join(directory, 'index')).search(guide)
+            self.assertEqual(hits.site, 'TCAAGCA')
+            self.assertEqual(hits.hits, [('tx1', 3, 0), ('tx2', 1, 0)])
+            self.assertEqual(hits.records, {'tx1': 1, 'tx2': 1})
+            self.assertEqual(index.count('ANNNNNNNAAAAAAAAAAAAA'), 0)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_fm_index(self):
+        """Tests for full-length off-target search with mismatches"""
+        directory = tempfile.mkdtemp()
+        try:
+            fasta = os.path.join(directory, 'transcripts.fa')
+            with open(fasta, 'w') as f:
+                f.write('>tx1\nAAGGCACCUGAUCGCCAUGAAUCC\n'
+                        '>tx2\nGGCACCUGAUCGGCAUGAAUCNN\n'
+                        '>tx3\nGGCACCUGAUCGGCAUGA\n')
+            index = offtarget.FMIndex.build(fasta,
+                                            os.path.join(directory, 'index'))
+            # site GGCACCUGAUCGCCAUGAAUC
+            guide = 'GAUUCAUGGCGAUCAGGUGCC'
+            self.assertEqual(index.search(guide, 0).hits, [('tx1', 3, 0)])
+            hits = offtarget.FMIndex(
+                os.path.join(directory, 'index')).search_batch([guide], 1)[0]
+            self.assertEqual(hits.site, 'GGCACCTGATCGCCATGAATC')
+            self.assertEqual(hits.hits, [('tx1', 3, 0), ('tx2', 1, 1)])
+            self.assertEqual(hits.records, {'tx1': 1, 'tx2': 1})
+        finally:
+            shutil.rmtree(directory)
+
+    def test_score_templates(self):
+        """Tests for scoring templates against former scoring
+        on shipped score files"""
+        generator = random.Random(10)
+        cwd = os.getcwd()
+        directory = tempfile.mkdtemp()
+        try:
+            os.chdir(reference.DESIGNER_PATH)
+            for row in reference.backbone_rows():
+                orginal = Backbone(**row)
+                frame = (orginal, orginal.miRNA_s, orginal.miRNA_a)
+                size = len(orginal.template(orginal.miRNA_s, orginal.miRNA_a))
+                _, data = reference.parse_score(u'.' + orginal.structure)
+                partners = dict(pair for pair, _ in data)
+                tests = [[[number, partners.get(number, 0)]
+                          for number in range(1, size + 1)]]
+                tests.extend([[number, generator.choice([0, number + 3])]
+                              for number in range(1, size + 1)]
+                             for _ in range(5))
+                for frame_ss in tests:
+                    self.assertEqual(
+                        score.score_frame(frame, frame_ss, orginal),
+                        reference.score_frame(frame, frame_ss, orginal))
+                self.assertEqual(score.score_frame(frame, tests[0], orginal),
+                                 100)
+
+            # the same position with two partners, only the right one counts
+            os.chdir(directory)
+            with open('duplicates', 'w') as f:
+                f.write('16\n1 10 5\n1 12 7\n2 0 3\n2 0 1\n3 9 4\n')
+            orginal = orginal.copy(name='duplicates', structure='/duplicates')
+            frame = (orginal, orginal.miRNA_s, orginal.miRNA_a)
+            unpaired = [[number, 0] for number in range(4, size + 1)]
+            tests = [([[1, 12], [2, 0], [3, 0]], 69),
+                     ([[1, 10], [2, 0], [3, 9]], 82),
+                     ([[1, 11], [2, 5], [3, 9]], 25)]
+            for frame_ss, expected in tests:
+                self.assertEqual(
+                    score.score_frame(frame, frame_ss + unpaired, orginal),
+                    expected)
+                self.assertEqual(
+                    reference.score_frame(frame, frame_ss + unpaired, orginal),
+                    expected)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory)
+            score.templates.clear()
+
+    def test_score_frames(self):
+        """Tests for scoring frames in batches against former scoring
+        of single frames"""
+        generator = random.Random(11)
+        rows = reference.backbone_rows()
+        cwd = os.getcwd()
+        try:
+            os.chdir(reference.DESIGNER_PATH)
+            partners = dict(
+                (row['name'], dict(pair for pair, _ in reference.parse_score(
+                    u'.' + row['structure'])[1])) for row in rows)
+            frames, frames_ss, orginals = [], [], []
+            for _ in range(20):
+                seq1, seq2 = [''.join(generator.choice('acgt') for _ in
+                                      range(generator.randint(19, 21)))
+                              for _ in range(2)]
+                shift_left = generator.choice(utils.SHIFTS)
+                shift_right = generator.choice(utils.SHIFTS)
+                frames_of_shifts = utils.get_frames(seq1, seq2, shift_left,
+                                                    shift_right, rows)
+                for frame, row in zip(frames_of_shifts, rows):
+                    size = len(frame[0].template(frame[1], frame[2]))
+                    frame_ss = [[number, partners[row['name']].get(number, 0)
+                                 if generator.random() < 0.8
+                                 else generator.randint(0, size)]
+                                for number in range(1, size + 1)]
+                    frames.append(frame)
+                    frames_ss.append(frame_ss)
+                    orginals.append(Backbone(**row))
+            expected = [reference.score_frame(frame, frame_ss, orginal)
+                        for frame, frame_ss, orginal
+                        in zip(frames, frames_ss, orginals)]
+            self.assertEqual(
+                list(score.score_frames(frames, frames_ss, orginals)),
+                expected)
+            self.assertTrue(max(expected) > 50)
+            self.assertEqual(
+                [score.score_frame(frame, frame_ss, orginal) for
+                 frame, frame_ss, orginal in zip(frames, frames_ss,
+                                                 orginals)[:10]],
+                expected[:10])
+            self.assertEqual(list(score.score_frames([], [], [])), [])
+        finally:
+            os.chdir(cwd)
+            score.templates.clear()
+
+    def test_get_frames(self):
+        """Tests for frames built from recipes against former frames
+        at every pair of siRNA ends"""
+        generator = random.Random(12)
+        rows = reference.backbone_rows()
+        # backbones with other ends cover all branches of recipes
+        rows.extend(dict(row, miRNA_end_5=end_5, miRNA_end_3=end_3)
+                    for row in rows[:2] for end_5 in (-3, 0, 3)
+                    for end_3 in (-3, 0, 3))
+        shifts = [(left, right) for left in utils.SHIFTS
+                  for right in utils.SHIFTS] + [(7, -8), (-7, 8)]
+        for shift_left, shift_right in shifts:
+            seq1, seq2 = [''.join(generator.choice('acgt') for _ in
+                                  range(generator.randint(19, 21)))
+                          for _ in range(2)]
+            frames = utils.get_frames(seq1, seq2, shift_left, shift_right,
+                                      rows)
+            expected = reference.get_frames(seq1, seq2, shift_left,
+                                            shift_right, rows)
+            self.assertEqual(
+                [(vars(frame), seq1, seq2) for frame, seq1, seq2 in frames],
+                [(vars(frame), seq1, seq2) for frame, seq1, seq2 in expected])
+
+    def test_pattern_scanner(self):
+        """Tests for search of patterns by PatternScanner against former
+        search with regular expressions"""
+        generator = random.Random(18)
+
+        def random_pattern():
+            tokens = []
+            for _ in range(generator.randint(1, 5)):
+                letters = ''.join(generator.sample('ACGTU',
+                                                   generator.randint(1, 5)))
+                token = '[%s]' % letters if generator.random() < 0.8 \
+                    else letters[0]
+                if generator.random() < 0.4:
+                    token += '{%d}' % generator.randint(1, 6)
+                tokens.append(token)
+            pattern = ''.join(tokens)
+            # patterns of unlimited length and alternatives
+            if generator.random() < 0.1 and not pattern.endswith('}'):
+                pattern += '+'
+            if generator.random() < 0.05:
+                pattern = '(%s)|GG' % pattern
+            return pattern
+
+        for _ in range(200):
+            patterns = dict((key, [random_pattern() for _ in
+                                   range(generator.randint(0, 4))])
+                            for key in range(generator.randint(1, 4)))
+            mrna = ''.join(generator.choice('ACGTUN') for _ in
+                           range(generator.randint(0, 200)))
+            expected = reference.find_by_patterns(patterns, mrna)
+            found = search.find_by_patterns(patterns, mrna)
+            self.assertEqual(sorted(found), sorted(expected))
+            for key in expected:
+                self.assertEqual(sorted(found[key]), sorted(expected[key]))
+
+    def test_stream_by_patterns(self):
+        """Tests for search of FASTA file in chunks against search
+        of whole records, also for matches across chunks"""
+        generator = random.Random(19)
+        patterns = {'fixed': ['[AG]C[GT]{3}A', 'UUU', 'G[AC]G'],
+                    'other': ['(A|CG)[GT]{2}', 'C[AG]{1,3}U']}
+        records = [('tx%d' % number,
+                    ''.join(generator.choice('ACGTU') for _ in
+                            range(generator.randint(0, 120))))
+                   for number in range(6)]
+        fasta = ''.join('>%s description\n%s\n' % (
+            name, '\n'.join(sequence[start:start + 13] for start in
+                            range(0, len(sequence), 13)))
+                        for name, sequence in records)
+        expected = sorted(
+            (name, start, key, result.group())
+            for name, sequence in records
+            for key, patt_list in patterns.items() for pattern in patt_list
+            for start in range(len(sequence))
+            for result in [re.compile(pattern).match(sequence, start)]
+            if result)
+        for chunk_size in (1, 4, 7, 64, 1024):
+            self.assertEqual(sorted(search.stream_by_patterns(
+                patterns, StringIO(fasta), chunk_size)), expected)
+        # matches which start in one chunk and end in the next one
+        self.assertTrue([hit for hit in expected
+                         if hit[1] // 7 != (hit[1] + len(hit[3]) - 1) // 7])
+        self.assertRaises(ValueError, list, search.stream_by_patterns(
+            {'long': ['A+']}, StringIO(fasta)))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file